@@ -0,0 +1,99 @@
+"""
+Measure the CPU time and memory of turning Census batch responses into the matched and unmatched rows written by
+`main.append_census_result`, for the typed post-processing of `DataHandler` against the previous one, which parsed
+every column, copied the result through an object array and derived block groups from strings. Each variant runs
+in its own process on the same synthetic response, so that their peak RSS are not mixed.
+
+Run from the root of the repository:
+    python -m benchmark.bench_census_parse --rows 100000 1000000
+"""
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import random
+import resource
+import time
+
+import pandas as pd
+
+from src.data_handler import DataHandler
+from src.metrics import Metrics
+
+VARIANTS = ['object', 'typed']
+
+
+def census_response(rows: int, match_rate: float = 0.8, seed: int = 0) -> bytes:
+    """
+    A response of the Census batch endpoint for rows addresses, about match_rate of them matched
+    """
+    rng = random.Random(seed)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for i in range(rows):
+        address = f'{i + 1} MADISON ST, CHICAGO, IL, 60602'
+        if rng.random() < match_rate:
+            writer.writerow([i, address, 'Match', 'Exact', address, '-87.628888,41.88345', 1000 + i, 'L', '17',
+                             '031', f'{rng.randrange(10 ** 6):06d}', f'{rng.randrange(1000, 5000)}'])
+        else:
+            writer.writerow([i, address, rng.choice(['No_Match', 'Tie'])])
+    return output.getvalue().encode()
+
+
+def object_post_processing(response_body: bytes):
+    """
+    The post-processing before the typed one, as it was in `DataHandler` and `main.append_census_result`
+    """
+    census_df = pd.read_csv(io.BytesIO(response_body), header=None, names=DataHandler.CENSUS_COLUMNS)
+    result = pd.DataFrame(data=census_df.iloc[:, [0, 1, 2, 4, -4, -3, -2, -1]].values,
+                          columns=DataHandler.RESULT_COLUMNS)
+    result['tract'] = result['tract'].astype("Int64")
+    result['block'] = result['block'].astype("Int64")
+    matched = result[result['is_matched'] == 'Match'].drop('is_matched', axis=1)
+    matched['blockgroup'] = matched['block'].astype(str).str[0]
+    unmatched_and_tie = result[result['is_matched'] != 'Match'].drop('is_matched', axis=1)
+    return matched, unmatched_and_tie
+
+
+def typed_post_processing(response_body: bytes):
+    data_handler = DataHandler(census_key='benchmark', metrics=Metrics())
+    result = data_handler._shape_census_result(DataHandler.parse_census_response(response_body))
+    matched, unmatched_and_tie = DataHandler.partition(result)
+    return matched.assign(blockgroup=matched['block'] // 1000), unmatched_and_tie
+
+
+def _child(variant: str, rows: int, queue) -> None:
+    response_body = census_response(rows)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    post_processing = object_post_processing if variant == 'object' else typed_post_processing
+    start = time.process_time()
+    matched, unmatched_and_tie = post_processing(response_body)
+    seconds = time.process_time() - start
+    # ru_maxrss is in kilobytes on Linux
+    rss_increase = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    result_bytes = sum(df.memory_usage(deep=True).sum() for df in (matched, unmatched_and_tie))
+    queue.put({'variant': variant, 'rows': rows, 'cpu_seconds': round(seconds, 3),
+               'peak_rss_increase_mb': round(rss_increase / 1024, 1), 'result_mb': round(result_bytes / 2 ** 20, 1),
+               'matched': len(matched), 'unmatched_and_tie': len(unmatched_and_tie)})
+
+
+def main(args) -> list:
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for rows in args.rows:
+        for variant in args.variants:
+            queue = context.Queue()
+            process = context.Process(target=_child, args=(variant, rows, queue))
+            process.start()
+            reports.append(queue.get())
+            process.join()
+            print(json.dumps(reports[-1]), flush=True)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the post-processing of Census batch responses')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000])
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=VARIANTS)
+    main(parser.parse_args())
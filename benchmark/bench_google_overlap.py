@@ -0,0 +1,69 @@
+"""
+Measure how well the Google and Census legs of `Geocoder.process` overlap for different sizes of the Google thread
+pool. Google and Census are replaced by fakes with a fixed latency, so no key is used and nothing is sent.
+
+Run from the root of the repository:
+    python -m benchmark.bench_google_overlap --rows 200 --latency 0.1
+"""
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from src import constants
+from src.geocoder import Geocoder
+from src.scheduler import Scheduler
+
+GOOGLE_RESULT = [{'geometry': {'location': {'lat': 41.88345, 'lng': -87.628888}},
+                  'formatted_address': '70 W Madison St, Chicago, IL 60602, USA',
+                  'address_components': []}]
+CENSUS_RESULT = {'result': {'geographies': {'2020 Census Blocks': [{'BLKGRP': '1', 'BLOCK': '1008'}],
+                                            'Census Tracts': [{'TRACT': '003201'}]}}}
+
+
+class FakeCensusResponse:
+    status = 200
+
+    async def read(self):
+        return json.dumps(CENSUS_RESULT).encode()
+
+
+def make_geocoder(workers: int, latency: float) -> Geocoder:
+    scheduler = Scheduler(max_in_flight=1000, rates={constants.GOOGLE_UPSTREAM: 1e6, constants.CENSUS_COORD_UPSTREAM: 1e6})
+    gs = Geocoder(scheduler=scheduler, executor_workers=workers)
+
+    def fake_google(addr):
+        time.sleep(latency)  # blocking, like `requests`
+        return GOOGLE_RESULT
+
+    async def fake_census(lng, lat, session):
+        await asyncio.sleep(latency)
+        return FakeCensusResponse()
+
+    gs._call_api_from_addr_to_lng_lat = fake_google
+    gs._call_api_from_lat_lng_to_block = fake_census
+    gs.logger = SimpleNamespace(debug=lambda *_: None, warning=lambda *_: None, error=lambda *_: None)
+    return gs
+
+
+async def run(workers: int, rows: int, latency: float) -> float:
+    gs = make_geocoder(workers, latency)
+    start = time.perf_counter()
+    await asyncio.gather(*(gs.process(f'{i} W MADISON ST, CHICAGO, IL, 60602', session=None) for i in range(rows)))
+    elapsed = time.perf_counter() - start
+    gs.close()
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the overlap of the Google and Census legs')
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.1, help='Latency of each fake request, in seconds')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 32])
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'seconds':>8} {'rows/sec':>9}")
+    for workers in args.workers:
+        elapsed = asyncio.run(run(workers, args.rows, args.latency))
+        print(f"{workers:>8} {elapsed:>8.2f} {args.rows / elapsed:>9.1f}")
@@ -0,0 +1,113 @@
+"""
+Measure the fixed cost of starting `main.py`, with `python -X importtime`, and check it against a budget. Each case
+runs in a fresh interpreter:
+
+    import: `import main`, paid by every run, `--help` included
+    census: a whole run of `main.py --no-cache --no-dedupe` on a file Census matches completely, against `MockServer`
+
+A run that needs no Google fallback must not load the Google client, the address tagger, the progress bar or the
+HTTP server of `--serve`. The benchmark exits with an error if a case does, or if its imports take longer than
+--budget seconds.
+
+Run from the root of the repository:
+    python -m benchmark.bench_startup --budget 1.5 --rows 1000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Tuple
+
+from benchmark.mock_server import ADDRESS_BATCH_PATH, MockServer
+from benchmark.run_benchmarks import FAKE_SECRET, REPO_ROOT, write_addresses
+
+CASES = ['import', 'census']
+# Modules only the Google stage, or `--serve`, needs
+DEFERRED_MODULES = ['googlemaps', 'usaddress', 'tqdm', 'aiohttp.web']
+BOOTSTRAP = "import sys; sys.path.insert(0, {repo!r})\n"
+CODE = {
+    'import': "import main\n",
+    'census': ("import logging, runpy\n"
+               "from src import constants\n"
+               "constants.CENSUS_BATCH_URL = {batch_url!r}\n"
+               "constants.LOGGING_LEVEL = logging.WARNING\n"
+               "sys.argv = ['main.py', '-f', {path!r}, '--no-cache', '--no-dedupe']\n"
+               "runpy.run_path({main!r}, run_name='__main__')\n"),
+}
+
+
+def import_times(output: str) -> Dict[str, Tuple[int, int, int]]:
+    """
+    Parse the output of `python -X importtime`
+    Returns:
+        module -> (microseconds of its own import, microseconds including its own imports, nesting level)
+    """
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us), (len(name) - len(name.lstrip()) - 1) // 2)
+    return times
+
+
+def run_case(case: str, workdir: str, path: str, base_url: str) -> dict:
+    """
+    Run a case in a new interpreter, in workdir
+    """
+    code = BOOTSTRAP.format(repo=REPO_ROOT) + CODE[case].format(batch_url=base_url + ADDRESS_BATCH_PATH, path=path,
+                                                                 main=os.path.join(REPO_ROOT, 'main.py'))
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=workdir, capture_output=True,
+                             text=True, env=dict(os.environ, TQDM_DISABLE='1'))
+    seconds = time.perf_counter() - start
+    # The next run would otherwise refuse to start, see `main.validate_filename`
+    for name in ('matched_census.csv', 'unmatched_census.csv', 'addresses_finished.csv'):
+        if os.path.exists(os.path.join(workdir, name)):
+            os.remove(os.path.join(workdir, name))
+    if process.returncode:
+        raise RuntimeError(f"The {case} case failed:\n{process.stderr[-2000:]}")
+
+    times = import_times(process.stderr)
+    top_level = sorted(((cumulative, name) for name, (_, cumulative, level) in times.items() if level == 0),
+                       reverse=True)
+    return {'case': case, 'seconds': round(seconds, 3),
+            'import_seconds': round(sum(self_us for self_us, _, _ in times.values()) / 1e6, 3),
+            'modules': len(times),
+            'slowest': {name: round(cumulative / 1e6, 3) for cumulative, name in top_level[:5]},
+            'deferred_imported': [name for name in DEFERRED_MODULES if name in times]}
+
+
+def main(args) -> list:
+    server = MockServer(latency=0, match_rate=1.0)
+    base_url = server.start()
+    reports = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            with open(os.path.join(workdir, 'secret.yaml'), 'w') as f:
+                f.write(FAKE_SECRET)
+            path = os.path.join(workdir, 'addresses.csv')
+            write_addresses(path, args.rows)
+            for case in args.cases:
+                # The best of a few runs, the first one also pays for a cold disk cache
+                report = min((run_case(case, workdir, path, base_url) for _ in range(args.repeat)),
+                             key=lambda report: report['import_seconds'])
+                report['within_budget'] = report['import_seconds'] <= args.budget and not report['deferred_imported']
+                reports.append(report)
+                print(json.dumps(reports[-1]), flush=True)
+    finally:
+        server.stop()
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the startup of main.py against an import time budget')
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--budget', type=float, default=1.5, help='Seconds the imports of a case may take')
+    parser.add_argument('--rows', type=int, default=1000, help='Rows of the file of the census case')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each case, the fastest is reported')
+    reports = main(parser.parse_args())
+    sys.exit(0 if all(report['within_budget'] for report in reports) else 1)
@@ -0,0 +1,164 @@
+"""
+A local stand-in for the Census batch endpoint, the Census coordinates endpoint and the Google geocoding endpoint,
+with a configurable latency, error rate and throttling, so that the pipeline can be measured without keys or network.
+"""
+import asyncio
+import csv
+import io
+import random
+import threading
+import time
+import zlib
+from typing import Optional
+
+from aiohttp import web
+
+ADDRESS_BATCH_PATH = '/geocoder/geographies/addressbatch'
+COORDINATES_PATH = '/geocoder/geographies/coordinates'
+GOOGLE_GEOCODE_PATH = '/maps/api/geocode/json'
+
+
+def _stable_hash(value: str) -> int:
+    return zlib.crc32(value.encode())
+
+
+def _tract_block(value: str):
+    """
+    A made-up but stable tract and block for an address or a coordinate
+    """
+    h = _stable_hash(value)
+    return 100 + h % 900000, 1000 * (1 + h % 9) + h % 1000
+
+
+class MockServer:
+    """
+    Serve the three endpoints on 127.0.0.1 from a background thread with its own event loop
+
+    Args:
+        latency: Seconds each request waits before answering
+        row_latency: Extra seconds per row of a Census batch
+        error_rate: Fraction of the requests answered with a 500
+        max_requests_per_second: Requests over this rate, in a given second, are answered with a 429
+        match_rate: Fraction of the addresses Census matches, the others are left to Google
+        seed: Seed of the errors
+    """
+
+    def __init__(self, latency: float = 0.05, row_latency: float = 0.0, error_rate: float = 0.0,
+                 max_requests_per_second: Optional[float] = None, match_rate: float = 0.8, seed: int = 0):
+        self.latency = latency
+        self.row_latency = row_latency
+        self.error_rate = error_rate
+        self.max_requests_per_second = max_requests_per_second
+        self.match_rate = match_rate
+        self.random = random.Random(seed)
+        self.requests = self.errors = self.throttled = 0
+        self.current_second, self.requests_this_second = 0, 0
+        self.base_url = None
+        self.loop = None
+        self.thread = None
+        self.runner = None
+
+    def _reject(self) -> Optional[web.Response]:
+        """
+        Answer 429 or 500 to some requests, as configured
+        """
+        self.requests += 1
+        now = int(time.monotonic())
+        if now != self.current_second:
+            self.current_second, self.requests_this_second = now, 0
+        self.requests_this_second += 1
+        if self.max_requests_per_second and self.requests_this_second > self.max_requests_per_second:
+            self.throttled += 1
+            return web.Response(status=429, text='Too Many Requests')
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=500, text='Internal Server Error')
+        return None
+
+    def _is_matched(self, address: str) -> bool:
+        return _stable_hash(address.upper()) % 1000 < self.match_rate * 1000
+
+    async def address_batch(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        rejection = self._reject()
+        if rejection is not None:
+            return rejection
+        rows = list(csv.reader(io.StringIO(form['addressFile'].file.read().decode())))
+        await asyncio.sleep(self.latency + self.row_latency * len(rows))
+
+        output = io.StringIO()
+        writer = csv.writer(output)
+        for row_id, street, city, state, zip_code in rows:
+            address = f'{street}, {city}, {state}, {zip_code}'
+            if self._is_matched(address):
+                tract, block = _tract_block(address)
+                writer.writerow([row_id, address, 'Match', 'Exact', address.upper(), '-87.628888,41.88345',
+                                 '111111111', 'L', '17', '031', f'{tract:06d}', f'{block:04d}'])
+            else:
+                writer.writerow([row_id, address, 'No_Match'])
+        return web.Response(text=output.getvalue(), content_type='text/csv')
+
+    async def coordinates(self, request: web.Request) -> web.Response:
+        rejection = self._reject()
+        if rejection is not None:
+            return rejection
+        await asyncio.sleep(self.latency)
+        tract, block = _tract_block(f"{request.query['x']},{request.query['y']}")
+        return web.json_response({'result': {'geographies': {
+            '2020 Census Blocks': [{'BLKGRP': str(block // 1000), 'BLOCK': f'{block:04d}'}],
+            'Census Tracts': [{'TRACT': f'{tract:06d}'}]}}})
+
+    async def google_geocode(self, request: web.Request) -> web.Response:
+        rejection = self._reject()
+        if rejection is not None:
+            return rejection
+        await asyncio.sleep(self.latency)
+        street, city, state, zip_code = (part.strip() for part in (request.query['address'].split(',') + [''] * 4)[:4])
+        number, _, route = street.partition(' ')
+        h = _stable_hash(request.query['address'])
+        return web.json_response({'status': 'OK', 'results': [{
+            'formatted_address': f'{street}, {city}, {state} {zip_code}, USA',
+            'geometry': {'location': {'lat': 25 + h % 2400 / 100, 'lng': -124 + h % 5700 / 100}},
+            'address_components': [{'long_name': number, 'short_name': number, 'types': ['street_number']},
+                                   {'long_name': route, 'short_name': route, 'types': ['route']},
+                                   {'long_name': city, 'short_name': city, 'types': ['locality', 'political']},
+                                   {'long_name': state, 'short_name': state,
+                                    'types': ['administrative_area_level_1', 'political']},
+                                   {'long_name': zip_code, 'short_name': zip_code, 'types': ['postal_code']}]}]})
+
+    def start(self) -> str:
+        """
+        Start serving in a background thread
+        Returns:
+            The base URL of the server
+        """
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post(ADDRESS_BATCH_PATH, self.address_batch)
+        app.router.add_get(COORDINATES_PATH, self.coordinates)
+        app.router.add_get(GOOGLE_GEOCODE_PATH, self.google_geocode)
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def serve():
+            self.runner = web.AppRunner(app, access_log=None)
+            await self.runner.setup()
+            site = web.TCPSite(self.runner, '127.0.0.1', 0)
+            await site.start()
+            port = self.runner.addresses[0][1]
+            self.base_url = f'http://127.0.0.1:{port}'
+            started.set()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(serve())
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
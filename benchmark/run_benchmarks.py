@@ -0,0 +1,165 @@
+"""
+Measure the throughput, latency and memory of the pipeline against `MockServer`, so that a regression shows up
+before it reaches production. Three cases are run over synthetic address files:
+
+    census: `DataHandler.batch_process_csv`, with every request timed as a Census batch
+    google: `main.process_unmatched_csv`, with every request timed as one address through Google and Census
+    main:   the whole `main.py`, as it is run from the command line
+
+Each case runs in its own process, so that its peak RSS is not mixed with the others. No key is used and nothing
+leaves the machine.
+
+Run from the root of the repository:
+    python -m benchmark.run_benchmarks --rows 10000 100000 --cases census google main --latency 0.05
+"""
+import argparse
+import asyncio
+import csv
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import runpy
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark.mock_server import ADDRESS_BATCH_PATH, COORDINATES_PATH, MockServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = ['census', 'google', 'main']
+STREETS = ['MADISON ST', 'YOUNGSTOWN WARREN RD', 'MAIN ST', 'OAK AVE', 'PARK BLVD', 'LAKE SHORE DR', 'ELM ST']
+PLACES = [('CHICAGO', 'IL', '60602'), ('NILES', 'OH', '44446'), ('AMERICAN FORK', 'UT', '84003'),
+          ('AUSTIN', 'TX', '78701'), ('DENVER', 'CO', '80202')]
+# A key in the format googlemaps checks for, it is only ever sent to the mock server
+FAKE_SECRET = "key:\n  census_api: benchmark\n  google_api: AIzaBenchmarkKeyNeverSentAnywhere\n"
+
+
+def write_addresses(path: str, rows: int, duplicate_rate: float = 0.0, seed: int = 0) -> None:
+    """
+    Write a file in the input format of `main.py`, where about `duplicate_rate` of the rows repeat an earlier address
+    """
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for i in range(rows):
+            n = rng.randrange(i) if i and rng.random() < duplicate_rate else i
+            city, state, zip_code = PLACES[n % len(PLACES)]
+            writer.writerow([i, f'{n + 1} {STREETS[n % len(STREETS)]}', city, state, zip_code])
+
+
+def time_calls(owner, name: str, latencies: list) -> None:
+    """
+    Wrap the coroutine method `owner.name` to append the seconds of each call to latencies
+    """
+    method = getattr(owner, name)
+
+    @functools.wraps(method)
+    async def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    setattr(owner, name, timed)
+
+
+def run_case(case: str, path: str, base_url: str) -> dict:
+    """
+    Run a case in the current process, against the mock server at base_url
+    """
+    from src import constants
+    constants.CENSUS_BATCH_URL = base_url + ADDRESS_BATCH_PATH
+    constants.CENSUS_GEOCODER_FROM_COORD = base_url + COORDINATES_PATH
+    constants.GOOGLE_BASE_URL = base_url
+    constants.LOGGING_LEVEL = logging.WARNING
+    # The point is to measure the code, not the rate limits of the real services
+    constants.RATE_LIMITS_PER_SECOND.update({upstream: 1e6 for upstream in constants.RATE_LIMITS_PER_SECOND})
+
+    import main
+    from src.data_handler import DataHandler
+    from src.geocoder import Geocoder
+
+    latencies = []
+    start = time.perf_counter()
+    if case == 'census':
+        time_calls(DataHandler, '_post_batch_to_census', latencies)
+        asyncio.run(DataHandler().batch_process_csv(path))
+    elif case == 'google':
+        time_calls(Geocoder, 'process', latencies)
+        df = pd.read_csv(path, header=None, names=['ID', 'Street address', 'City', 'State', 'ZIP'], dtype=str)
+        df['Street address'] = df[['Street address', 'City', 'State', 'ZIP']].agg(', '.join, axis=1)
+        asyncio.run(main.process_unmatched_csv(df[['ID', 'Street address']]))
+    else:
+        time_calls(DataHandler, '_post_batch_to_census', latencies)
+        time_calls(Geocoder, 'process', latencies)
+        sys.argv = ['main.py', '-f', path, '--no-cache']
+        runpy.run_path(os.path.join(REPO_ROOT, 'main.py'), run_name='__main__')
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'latencies': latencies,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def _child(case: str, path: str, base_url: str, workdir: str, queue) -> None:
+    os.environ['TQDM_DISABLE'] = '1'
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)  # for secret.yaml and the temporary files of main.py
+    queue.put(run_case(case, path, base_url))
+
+
+def report(case: str, rows: int, result: dict) -> dict:
+    latencies = np.array(result['latencies']) * 1000
+    return {'case': case, 'rows': rows, 'seconds': round(result['seconds'], 3),
+            'rows_per_second': round(rows / result['seconds'], 1),
+            'requests': len(latencies),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+            'p99_ms': round(float(np.percentile(latencies, 99)), 1) if len(latencies) else None,
+            'peak_rss_mb': round(result['peak_rss_mb'], 1)}
+
+
+def main(args) -> list:
+    server = MockServer(latency=args.latency, row_latency=args.row_latency, error_rate=args.error_rate,
+                        max_requests_per_second=args.max_requests_per_second, match_rate=args.match_rate)
+    base_url = server.start()
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    try:
+        for rows in args.rows:
+            with tempfile.TemporaryDirectory() as workdir:
+                with open(os.path.join(workdir, 'secret.yaml'), 'w') as f:
+                    f.write(FAKE_SECRET)
+                path = os.path.join(workdir, f'addresses_{rows}.csv')
+                write_addresses(path, rows, args.duplicate_rate)
+                for case in args.cases:
+                    queue = context.Queue()
+                    process = context.Process(target=_child, args=(case, path, base_url, workdir, queue))
+                    process.start()
+                    result = queue.get()
+                    process.join()
+                    reports.append(report(case, rows, result))
+                    print(json.dumps(reports[-1]), flush=True)
+    finally:
+        server.stop()
+    print(f"Mock server: {server.requests} requests, {server.errors} errors, {server.throttled} throttled")
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline against a local mock of Census and Google')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000])
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help='Fraction of rows repeating an address')
+    parser.add_argument('--match-rate', type=float, default=0.8, help='Fraction of the addresses Census matches')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the mock server waits per request')
+    parser.add_argument('--row-latency', type=float, default=0.0, help='Extra seconds per row of a Census batch')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--max-requests-per-second', type=float, default=None,
+                        help='Requests over this rate are answered with a 429')
+    main(parser.parse_args())
@@ -1,76 +1,444 @@
 import argparse
 import asyncio
+import functools
 import logging
+import multiprocessing
 import os.path
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-import aiohttp
-import pandas as pd
-from tqdm.asyncio import tqdm_asyncio
-
 import src.constants
+from src.batch_tuner import BatchTuner
+from src.block_index import BlockIndex
+from src.cache import ResultCache
 from src.data_handler import DataHandler
-from src.geocoder import Geocoder
+from src.delta import delta_paths, split_delta
+from src.http_client import create_session, session_scope
+from src.journal import Journal
+from src.metrics import Metrics
+from src.normalizer import deduplicate_csv, fan_out, find_duplicates, row_id_key
+from src.prefilter import ZipIndex, prefilter_csv, zip_codes_of
+from src.result_files import FORMATS, ResultWriter, iter_results, merge_results, read_results, with_format
+from src.scheduler import Scheduler
+from src.sharding import split_csv
+
+FINISHED_COLUMNS = [c for c in DataHandler.RESULT_COLUMNS if c != 'is_matched'] + ['blockgroup', 'autocorrected_addr',
+                                                                                  'same_addr']
 
 
-async def process_unmatched_csv(df):
-    gs = Geocoder()
+async def process_unmatched_csv(df, cache=None, max_in_flight=src.constants.MAX_IN_FLIGHT_REQUESTS, journal=None,
+                                block_index=None, metrics=None, rates=None, session=None):
     if "Street address" not in df.columns:
         raise "Column address not found in the CSV file"
-    async with aiohttp.ClientSession() as session:
-        tuples = await tqdm_asyncio.gather(*(gs.process(v, session) for v in df['Street address'].values))
+    # Each address is processed once, then its result is given to every row with the same canonical address
+    first_positions, groups = find_duplicates(df['Street address'])
+    addresses = df['Street address'].values[first_positions]
+    logging.info(f"{len(df) - len(addresses)} of the {len(df)} unmatched rows are duplicated addresses")
+    # Imported here, so that a run where Census matches every address never loads the Google client
+    from src.geocoder import Geocoder
+    scheduler = Scheduler(max_in_flight, rates or src.constants.RATE_LIMITS_PER_SECOND, metrics=metrics)
+    gs = Geocoder(cache, scheduler, block_index=block_index, metrics=metrics)
+    try:
+        tuples = await geocode_addresses(gs, addresses, journal, session)
+    finally:
+        gs.close()
+    return [tuples[group] for group in groups]
+
+
+async def geocode_addresses(gs, addresses, journal=None, session=None):
+    from tqdm.asyncio import tqdm_asyncio
+    if journal is None:
+        async with session_scope(session) as session:
+            return await tqdm_asyncio.gather(*(gs.process(v, session) for v in addresses))
+
+    # Rows are processed and recorded in the journal GOOGLE_JOURNAL_ROWS at a time, so that a restarted run
+    # only processes the rows of unfinished ranges
+    tuples = [None] * len(addresses)
+    for start, stop, result in journal.results(Journal.GOOGLE):
+        tuples[start:stop] = result
+
+    failed = []
+
+    async def process_range(start, stop, session):
+        try:
+            result = await asyncio.gather(*(gs.process(v, session) for v in addresses[start:stop]))
+        except Exception as exc:
+            # Keep going with the other ranges, the failed rows are retried by the next run
+            logging.error(f"The unmatched rows {start} to {stop} failed: {exc!r}")
+            failed.append((start, stop))
+            return
+        journal.record(Journal.GOOGLE, start, stop, result)
+        tuples[start:stop] = result
+
+    ranges = [(start, min(stop, start + src.constants.GOOGLE_JOURNAL_ROWS))
+              for pending_start, stop in journal.pending_ranges(Journal.GOOGLE, 0, len(addresses))
+              for start in range(pending_start, stop, src.constants.GOOGLE_JOURNAL_ROWS)]
+    async with session_scope(session) as session:
+        await tqdm_asyncio.gather(*(process_range(start, stop, session) for start, stop in ranges))
+    if failed:
+        raise RuntimeError(f"{len(failed)} ranges of unmatched rows failed, run the program again to retry them")
     return tuples
 
 
+def set_output_format(output_format):
+    """
+    Write TEMP_MATCH_CSV and TEMP_UNMATCH_CSV in output_format, `csv` or `parquet`, from now on
+    """
+    src.constants.TEMP_MATCH_CSV = with_format(src.constants.TEMP_MATCH_CSV, output_format)
+    src.constants.TEMP_UNMATCH_CSV = with_format(src.constants.TEMP_UNMATCH_CSV, output_format)
+
+
+def append_census_result(result_with_columns, matched_writer, unmatched_writer):
+    """
+    Split a processed Census batch into matched and unmatched rows and append them to TEMP_MATCH_CSV and
+    TEMP_UNMATCH_CSV
+    """
+    matched, unmatched_and_tie = DataHandler.partition(result_with_columns)
+    # The first digit of a block is its block group
+    matched_writer.write(matched.assign(blockgroup=matched['block'] // 1000))
+    unmatched_writer.write(unmatched_and_tie)
+
+
+async def process_census_csv(dh, filename, journal=None, session=None):
+    """
+    Push filename to Census and append each batch to TEMP_MATCH_CSV and TEMP_UNMATCH_CSV as soon as it returns,
+    so that the whole result is never held in memory. With a journal, the batches finished by a previous run
+    are written from it instead of being submitted again
+    """
+    matched_columns = [c for c in DataHandler.RESULT_COLUMNS if c != 'is_matched'] + ['blockgroup']
+    with ResultWriter(src.constants.TEMP_MATCH_CSV, matched_columns) as matched_writer, \
+            ResultWriter(src.constants.TEMP_UNMATCH_CSV, matched_columns[:-1]) as unmatched_writer:
+        if journal is not None:
+            for _, _, result_with_columns in journal.results(Journal.CENSUS):
+                append_census_result(result_with_columns, matched_writer, unmatched_writer)
+        async with session_scope(session) as session:
+            async for result_with_columns in dh.iter_batches(filename, session, journal=journal):
+                append_census_result(result_with_columns, matched_writer, unmatched_writer)
+
+
+def write_finished_csv(path, unmatched_and_tie, duplicates=None, rejected=None):
+    """
+    Write the rows of TEMP_MATCH_CSV, a chunk at a time, followed by the rows resolved through Google. The rows
+    left out by `deduplicate_csv` are written along with the row of the same address, and the rows rejected by
+    `prefilter_csv` at the end, without a result. The IDs are written in their `row_id_key` form
+    """
+    with ResultWriter(path, FINISHED_COLUMNS) as writer:
+        for matched in iter_results(src.constants.TEMP_MATCH_CSV):
+            writer.write(fan_out(matched, duplicates))
+        writer.write(fan_out(unmatched_and_tie, duplicates))
+        if rejected is not None:
+            writer.write(rejected.assign(ID=rejected['ID'].map(row_id_key)))
+
+
+def finished_path(filename, output_format='csv'):
+    """
+    Returns:
+        The path of the finished file of filename, `<stem>_finished.<output_format>` next to it
+    """
+    return Path(filename).parent.joinpath(str(Path(filename).stem) + "_finished." + output_format)
+
+
 def validate_filename(filename):
     if not os.path.exists(filename):
         raise argparse.ArgumentTypeError(f"Cannot find file {filename} in path {os.getcwd()}")
     if (os.path.exists(src.constants.TEMP_UNMATCH_CSV)) and (os.path.exists(src.constants.TEMP_MATCH_CSV)):
-        if (filename != src.constants.TEMP_UNMATCH_CSV):
+        # With a journal, the previous run of this file is resumed without looking at the temporary files
+        if (filename != src.constants.TEMP_UNMATCH_CSV) and not os.path.exists(Journal.path_for(filename)):
             raise argparse.ArgumentTypeError(f'''Found a file named {src.constants.TEMP_UNMATCH_CSV}, which is a result
                 of the previous run. You may want to pass it in instead. To overcome this error, please delete both
                 {src.constants.TEMP_MATCH_CSV} and {src.constants.TEMP_UNMATCH_CSV} first and run the code again.''')
     return filename
 
 
+async def geocode_stages(dh, census_input, journal, cache=None, max_in_flight=src.constants.MAX_IN_FLIGHT_REQUESTS,
+                         block_index=None, metrics=None, rates=None):
+    """
+    Push census_input to Census, unless it is None, then send the rows Census could not match to Google. Both stages
+    share one HTTP session, so that the connections to Census opened by the first are reused by the second
+    Returns:
+        The rows Census could not match and their results from Google
+    """
+    async with create_session() as session:
+        if census_input is not None:
+            # split the CSV and pushed the chunks to Census
+            await process_census_csv(dh, census_input, journal, session)
+        unmatched_and_tie = read_results(src.constants.TEMP_UNMATCH_CSV)
+
+        logging.info(f'''There are still {len(unmatched_and_tie)} addresses that Census could not find a match.\n
+        They need to be posted to Google service.''')
+        tracts = []
+        if len(unmatched_and_tie):
+            tracts = await process_unmatched_csv(unmatched_and_tie, cache, max_in_flight, journal, block_index,
+                                                 metrics, rates, session)
+    return unmatched_and_tie, tracts
+
+
+def load_block_index(tiger, zip_index=None, filename=None):
+    """
+    Load the TIGER/Line shapefiles, if any. With a zip_index and a filename, only the blocks of the tracts of the ZIP
+    codes in filename are loaded
+    """
+    if not tiger:
+        return None
+    tracts = None
+    if zip_index is not None and filename is not None and filename != src.constants.TEMP_UNMATCH_CSV:
+        tracts = zip_index.tracts_of(zip_codes_of(filename))
+    return BlockIndex.from_shapefiles(tiger, tracts=tracts)
+
+
+def geocode_file(filename, cache=None, metrics=None, max_in_flight=src.constants.MAX_IN_FLIGHT_REQUESTS, dedupe=True,
+                 block_index=None, tuner=None, rates=None, output_format='csv', zip_index=None):
+    """
+    Run both stages on filename and write the result to `<stem>_finished.<output_format>` next to it. With a
+    zip_index, the rows whose ZIP code is not in their state are not sent to either stage
+    Returns:
+        The path of the finished file
+    """
+    dh = DataHandler(cache, tuner, metrics=metrics)
+    # The Census ranges of the journal are rows of the prefiltered and deduplicated file, which depends on these
+    journal = Journal(filename, f"dedupe={dedupe}:zip_index={zip_index.fingerprint() if zip_index else None}")
+    duplicates = None
+    rejected = None
+    census_input = None
+    if filename != src.constants.TEMP_UNMATCH_CSV:
+        census_input = filename
+        if zip_index is not None:
+            census_input = filename + src.constants.PREFILTERED_SUFFIX
+            rejected = prefilter_csv(filename, census_input, zip_index)
+            if metrics is not None:
+                metrics.count(Metrics.RESULTS, len(rejected), stage=Metrics.PREFILTER, result='Rejected')
+            logging.info(f"{len(rejected)} rows have a ZIP code outside of their state and are not geocoded")
+        if dedupe:
+            unique_input = filename + src.constants.DEDUPLICATED_SUFFIX
+            duplicates = deduplicate_csv(census_input, unique_input)
+            census_input = unique_input
+            logging.info(f"{len(duplicates)} rows have the same address as a previous row and are not sent to Census")
+    unmatched_and_tie, tracts = asyncio.run(geocode_stages(dh, census_input, journal, cache, max_in_flight, block_index,
+                                                           metrics, rates))
+    if tracts:
+        unmatched_and_tie[['tract', 'blockgroup', 'block', 'autocorrected_addr', 'same_addr']] = tracts
+
+    # create path for finished file
+    path_to_file = finished_path(filename, output_format)
+    write_finished_csv(path_to_file, unmatched_and_tie, duplicates, rejected)
+    journal.remove()
+    for suffix in (src.constants.PREFILTERED_SUFFIX, src.constants.DEDUPLICATED_SUFFIX):
+        if os.path.exists(filename + suffix):
+            os.remove(filename + suffix)
+    return path_to_file
+
+
+def geocode_shard(shard, cache_path, max_in_flight, dedupe, tiger, workers, output_format='csv', zcta=None):
+    """
+    Run `geocode_file` on a shard in a worker process, with a `workers`-th of the request budget, so that all the
+    workers together stay within the rate limits of a single process
+    Returns:
+        The path of the finished file of the shard and its metrics
+    """
+    logging.root.setLevel(src.constants.LOGGING_LEVEL)
+    set_output_format(output_format)
+    # The temporary files of each shard are kept next to it, instead of in the working directory
+    shard_prefix = os.path.splitext(shard)[0] + '_'
+    src.constants.TEMP_MATCH_CSV = shard_prefix + src.constants.TEMP_MATCH_CSV
+    src.constants.TEMP_UNMATCH_CSV = shard_prefix + src.constants.TEMP_UNMATCH_CSV
+    rates = {upstream: rate / workers for upstream, rate in src.constants.RATE_LIMITS_PER_SECOND.items()}
+    batches_in_flight = max(1, src.constants.MAX_BATCHES_IN_FLIGHT // workers)
+    tuner = BatchTuner(max_in_flight=min(src.constants.CENSUS_INITIAL_BATCHES_IN_FLIGHT, batches_in_flight),
+                       max_in_flight_limit=batches_in_flight)
+    cache = None if cache_path is None else ResultCache(cache_path)
+    metrics = Metrics()
+    zip_index = ZipIndex.from_relationship_file(zcta) if zcta else None
+    block_index = load_block_index(tiger, zip_index, shard)
+    try:
+        finished = geocode_file(shard, cache, metrics, max(1, max_in_flight // workers), dedupe, block_index, tuner,
+                                rates, output_format, zip_index)
+    finally:
+        if cache is not None:
+            cache.close()
+    return finished, metrics
+
+
+def geocode_sharded(filename, workers, cache_path=None, metrics=None,
+                    max_in_flight=src.constants.MAX_IN_FLIGHT_REQUESTS, dedupe=True, tiger=(), output_format='csv',
+                    zcta=None):
+    """
+    Split filename by the hash of its addresses into one shard per worker, run `geocode_shard` on each of them in a
+    pool of processes, so that parsing and address tagging use as many cores, and merge their finished files into
+    `<stem>_finished.<output_format>` next to filename. The rows are the same as with a single process, in another order
+    Returns:
+        The path of the finished file
+    """
+    shards = [shard for shard in split_csv(filename, workers) if os.path.getsize(shard)]
+    # The shards finished by a previous, interrupted run are kept, only the others are processed
+    finished = {}
+    for shard in shards:
+        path = finished_path(shard, output_format)
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(shard):
+            finished[shard] = path
+    if finished:
+        logging.info(f"Reusing the results of {len(finished)} shards of {filename} from the previous run")
+    pending = [shard for shard in shards if shard not in finished]
+    if pending:
+        with ProcessPoolExecutor(len(pending), mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {shard: pool.submit(geocode_shard, shard, cache_path, max_in_flight, dedupe, tiger, workers,
+                                          output_format, zcta)
+                       for shard in pending}
+            for shard, future in futures.items():
+                try:
+                    finished[shard], shard_metrics = future.result()
+                except Exception as exc:
+                    logging.error(f"The shard {shard} failed: {exc!r}")
+                    continue
+                if metrics is not None:
+                    metrics.merge(shard_metrics)
+    if len(finished) < len(shards):
+        raise RuntimeError(f"{len(shards) - len(finished)} shards failed, run the program again to retry them")
+
+    path_to_file = finished_path(filename, output_format)
+    if shards:
+        merge_results([finished[shard] for shard in shards], path_to_file)
+    else:
+        # filename has no row
+        with ResultWriter(path_to_file, FINISHED_COLUMNS):
+            pass
+    shutil.rmtree(filename + src.constants.SHARDS_SUFFIX)
+    return path_to_file
+
+
+def geocode_delta(filename, previous_filename, previous_finished, geocode, output_format='csv'):
+    """
+    Run geocode on the rows of filename added or changed since previous_filename only, and write their results along
+    with the results of the other rows, carried forward from previous_finished, to `<stem>_finished.<output_format>`
+    next to filename, so that a run takes a time proportional to the churn of the file instead of its size
+    Args:
+        geocode: `geocode_file` or `geocode_sharded` with every other argument bound, called with the changed rows
+    Returns:
+        The path of the finished file
+    """
+    changed_path, carried_path = split_delta(filename, previous_filename, previous_finished, output_format)
+    finished = [carried_path]
+    if os.path.getsize(changed_path):
+        finished.insert(0, geocode(changed_path))
+    else:
+        logging.info(f"No row of {filename} changed since {previous_filename}")
+
+    path_to_file = finished_path(filename, output_format)
+    merge_results(finished, path_to_file)
+    for path in finished + [changed_path]:
+        os.remove(path)
+    return path_to_file
+
+
+def remove_progress(filename):
+    """
+    Forget what previous, interrupted runs of filename recorded: its journal, its shards and its delta files
+    """
+    changed_path, _ = delta_paths(filename)
+    paths = [Journal.path_for(filename), Journal.path_for(changed_path), changed_path]
+    paths += [delta_paths(filename, output_format)[1] for output_format in FORMATS]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    for directory in (filename + src.constants.SHARDS_SUFFIX, changed_path + src.constants.SHARDS_SUFFIX):
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Address to Tracts, Block Groups and Blocks')
-    parser.add_argument('-f', default='processed_address.csv', type=validate_filename,
+    parser.add_argument('-f',
                         help='''
                         The path of the addresses file, which should not have header columns. However, according to
                         https://geocoding.geo.census.gov/geocoder/Geocoding_Services_API.html#_Toc7768597,
                         the columns are `Unique ID` (Just as a reference), `Street address`, `City`, `State`, `ZIP`
                         ''')
+    parser.add_argument('--cache', default=src.constants.CACHE_DB,
+                        help='The path of the cache of previously resolved addresses')
+    parser.add_argument('--no-cache', action='store_true', help='Send every address to Census and Google again')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore the progress recorded by a previous, interrupted run of the same file')
+    parser.add_argument('--no-dedupe', action='store_true',
+                        help='Send rows with the same address to Census separately instead of once')
+    parser.add_argument('--max-in-flight', type=int, default=src.constants.MAX_IN_FLIGHT_REQUESTS,
+                        help='The maximum number of simultaneous requests to Google and Census in the fallback stage')
+    parser.add_argument('--metrics-out',
+                        help='''Where to write the latency, bytes, retries and match rates of each stage at the end of
+                        the run, as JSON if the path ends with .json, in the Prometheus text format otherwise''')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='''Split the file into this many shards processed by as many processes, which share the
+                        rate limits and the requests in flight. Census batches in flight are at least one per worker''')
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help='''The format of the finished file and of the temporary files. Parquet keeps the types of
+                        the columns, is smaller and faster to read back, and needs pyarrow''')
+    parser.add_argument('--tiger', nargs='+', default=[],
+                        help='''TIGER/Line 2020 block shapefiles (tl_2020_<state>_tabblock20.shp) of the states of the
+                        addresses. Coordinates inside them are mapped to blocks locally instead of calling Census''')
+    parser.add_argument('--zcta',
+                        help='''The 2020 ZCTA to tract relationship file of Census (tab20_zcta520_tract20_natl.txt).
+                        Addresses whose ZIP code is not in their state are then left out without calling Google or
+                        Census, and --tiger only loads the blocks of the tracts of the ZIP codes of the input''')
+    parser.add_argument('--previous-input',
+                        help='''The previous version of the addresses file. Only the rows added or changed since then,
+                        by ID and address, are geocoded, the results of the others are copied from
+                        --previous-finished''')
+    parser.add_argument('--previous-finished', help='The finished file of --previous-input')
+    parser.add_argument('--serve', action='store_true',
+                        help='''Instead of a file, geocode addresses sent over HTTP to /geocode, one or a few at a time,
+                        with the clients and the cache kept warm between requests. -f is ignored''')
+    parser.add_argument('--host', default=src.constants.SERVICE_HOST, help='The address --serve listens on')
+    parser.add_argument('--port', type=int, default=src.constants.SERVICE_PORT, help='The port --serve listens on')
     args = parser.parse_args()
+    if not args.serve:
+        # The temporary files left by a previous run are looked for in the format of this one
+        set_output_format(args.format)
+        try:
+            args.f = validate_filename(args.f or 'processed_address.csv')
+        except argparse.ArgumentTypeError as exc:
+            parser.error(f"argument -f: {exc}")
+    if bool(args.previous_input) != bool(args.previous_finished):
+        parser.error("--previous-input and --previous-finished go together")
 
     logging.getLogger(__name__)
     logging.root.setLevel(src.constants.LOGGING_LEVEL)
 
-    dh = DataHandler()
-    if args.f != src.constants.TEMP_UNMATCH_CSV:
-        # split the CSV and pushed the chunks to Census
-        result_with_columns = asyncio.run(dh.batch_process_csv(args.f))
-
-        matched = result_with_columns[result_with_columns['is_matched'] == 'Match'].drop('is_matched', axis=1)
-        # Construct column "blockgroup" from 1st char of column "block"
-        matched['blockgroup'] = matched['block'].astype(str).str[0]
-        matched.to_csv(src.constants.TEMP_MATCH_CSV, index=False)
+    if args.serve:
+        from aiohttp import web
 
-        unmatched_and_tie = result_with_columns[result_with_columns['is_matched'] != 'Match'].drop('is_matched', axis=1)
-        unmatched_and_tie.to_csv(src.constants.TEMP_UNMATCH_CSV, index=False)
+        from src.service import GeocodingService, create_app
+        cache = None if args.no_cache else ResultCache(args.cache)
+        zip_index = ZipIndex.from_relationship_file(args.zcta) if args.zcta else None
+        service = GeocodingService(cache, load_block_index(args.tiger), args.max_in_flight, zip_index=zip_index)
+        web.run_app(create_app(service), host=args.host, port=args.port)
+        if cache is not None:
+            cache.close()
     else:
-        matched = pd.read_csv(src.constants.TEMP_MATCH_CSV)
-        unmatched_and_tie = pd.read_csv(src.constants.TEMP_UNMATCH_CSV)
-
-    logging.info(f'''There are still {len(unmatched_and_tie)} addresses that Census could not find a match.\n
-    They need to be posted to Google service.''')
-    tracts = asyncio.run(process_unmatched_csv(unmatched_and_tie))
-    unmatched_and_tie[['tract', 'blockgroup', 'block', 'autocorrected_addr', 'same_addr']] = tracts
+        metrics = Metrics()
+        cache_path = None if args.no_cache else args.cache
+        cache = None
+        if args.restart:
+            remove_progress(args.f)
+        if args.workers > 1 and args.f != src.constants.TEMP_UNMATCH_CSV:
+            geocode = functools.partial(geocode_sharded, workers=args.workers, cache_path=cache_path, metrics=metrics,
+                                        max_in_flight=args.max_in_flight, dedupe=not args.no_dedupe, tiger=args.tiger,
+                                        output_format=args.format, zcta=args.zcta)
+        else:
+            cache = None if cache_path is None else ResultCache(cache_path)
+            zip_index = ZipIndex.from_relationship_file(args.zcta) if args.zcta else None
 
-    final_result = pd.concat([matched, unmatched_and_tie])
-
-    # create path for finished file
-    finished_file_name = str(Path(args.f).stem) + "_finished.csv"
-    path_to_file = Path(args.f).parent
-    final_result.to_csv(path_to_file.joinpath(finished_file_name), index=False)
-    logging.info(f"DONE! Results are saved to {finished_file_name}")
+            def geocode(filename):
+                block_index = load_block_index(args.tiger, zip_index, filename)
+                return geocode_file(filename, cache, metrics, args.max_in_flight, not args.no_dedupe, block_index,
+                                    output_format=args.format, zip_index=zip_index)
+        if args.previous_input and args.f != src.constants.TEMP_UNMATCH_CSV:
+            finished_file_name = geocode_delta(args.f, args.previous_input, args.previous_finished, geocode,
+                                               args.format)
+        else:
+            finished_file_name = geocode(args.f)
+        if cache is not None:
+            cache.close()
+        for stage, summary in metrics.summary()['stages'].items():
+            logging.info(f"{stage}: {summary['count']} in {summary['seconds']:.1f}s ({summary['share_of_time']:.0%})")
+        if args.metrics_out:
+            metrics.write(args.metrics_out)
+        logging.info(f"DONE! Results are saved to {finished_file_name}")
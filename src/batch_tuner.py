@@ -0,0 +1,52 @@
+import logging
+
+from src import constants
+
+
+class BatchTuner:
+    """
+    Choose the size of Census batches and how many of them are in flight from the observed response times and
+    timeouts. The batch size follows the measured seconds per row so that a batch takes about `target_seconds`,
+    and the number of batches in flight grows by one after each batch faster than that target. A timeout halves both.
+    """
+
+    def __init__(self, batch_size: int = constants.CENSUS_INITIAL_BATCH_SIZE,
+                 max_in_flight: int = constants.CENSUS_INITIAL_BATCHES_IN_FLIGHT,
+                 min_batch_size: int = constants.CENSUS_MIN_BATCH_SIZE,
+                 max_batch_size: int = constants.MAX_LINES_ALLOWED_CENSUS,
+                 max_in_flight_limit: int = constants.MAX_BATCHES_IN_FLIGHT,
+                 target_seconds: float = constants.CENSUS_TARGET_BATCH_SECONDS):
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_in_flight_limit = max_in_flight_limit
+        self.target_seconds = target_seconds
+        self.seconds_per_row = None
+        self.logger = logging.getLogger(__name__)
+
+    def record_success(self, rows: int, seconds: float) -> None:
+        """
+        Update the parameters after a batch of `rows` rows returned in `seconds`
+        """
+        if rows == 0:
+            return
+        seconds_per_row = seconds / rows
+        if self.seconds_per_row is None:
+            self.seconds_per_row = seconds_per_row
+        else:
+            # Exponentially weighted average, so that a single slow batch does not change much
+            self.seconds_per_row += constants.CENSUS_TUNER_SMOOTHING * (seconds_per_row - self.seconds_per_row)
+        if seconds < self.target_seconds:
+            self.max_in_flight = min(self.max_in_flight_limit, self.max_in_flight + 1)
+        if self.seconds_per_row > 0:
+            self.batch_size = int(min(self.max_batch_size,
+                                      max(self.min_batch_size, self.target_seconds / self.seconds_per_row)))
+
+    def record_timeout(self) -> None:
+        """
+        Back off after a batch timed out
+        """
+        self.max_in_flight = max(1, self.max_in_flight // 2)
+        self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        self.logger.warning(f"Census batches reduced to {self.batch_size} rows and {self.max_in_flight} in flight")
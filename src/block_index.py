@@ -0,0 +1,169 @@
+import logging
+from collections import defaultdict
+from typing import Collection, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src import constants
+
+
+class BlockIndex:
+    """
+    Find the 2020 Census block of coordinates without calling Census, from the TIGER/Line block polygons of the
+    states we need (https://www2.census.gov/geo/tiger/TIGER2020/TABBLOCK20/). Polygons are indexed on a grid of
+    `cell_size` degrees, a point is only tested against the polygons whose bounding box overlaps its cell.
+    """
+
+    def __init__(self, polygons: Sequence[Sequence[np.ndarray]], states: Sequence[int], counties: Sequence[int],
+                 tracts: Sequence[int], blocks: Sequence[int], cell_size: float = constants.BLOCK_INDEX_CELL_DEGREES):
+        """
+        Args:
+            polygons:
+                For each block, its rings as arrays of (lng, lat) rows. Holes and parts are rings as well,
+                since a point is inside a block if it is inside an odd number of its rings
+            states, counties, tracts, blocks:
+                The FIPS codes of each block, as integers
+            cell_size:
+                The size of a cell of the grid, in degrees
+        """
+        self.logger = logging.getLogger(__name__)
+        self.cell_size = cell_size
+        self.states = np.asarray(states, dtype=np.int64)
+        self.counties = np.asarray(counties, dtype=np.int64)
+        self.tracts = np.asarray(tracts, dtype=np.int64)
+        self.blocks = np.asarray(blocks, dtype=np.int64)
+
+        edges, self.edge_offsets = [], np.zeros(len(polygons) + 1, dtype=np.int64)
+        grid = defaultdict(list)
+        for i, rings in enumerate(polygons):
+            rings = [np.asarray(ring, dtype=np.float64) for ring in rings]
+            # An edge goes from each point to the next one, the closing edge of a closed ring has a length of 0
+            edges.extend(np.hstack([ring, np.roll(ring, -1, axis=0)]) for ring in rings)
+            self.edge_offsets[i + 1] = self.edge_offsets[i] + sum(len(ring) for ring in rings)
+
+            points = np.vstack(rings)
+            (min_x, min_y), (max_x, max_y) = self._cells(points.min(axis=0)), self._cells(points.max(axis=0))
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    grid[self._cell_key(x, y)].append(i)
+        self.edges = np.vstack(edges) if edges else np.empty((0, 4))
+
+        # The grid is stored as sorted cell keys, and for the cell at position i of `cell_keys`, its polygons are
+        # `cell_polygons[cell_offsets[i]:cell_offsets[i + 1]]`
+        self.cell_keys = np.array(sorted(grid), dtype=np.int64)
+        self.cell_offsets = np.cumsum([0] + [len(grid[key]) for key in self.cell_keys], dtype=np.int64)
+        self.cell_polygons = np.array([i for key in self.cell_keys for i in grid[key]], dtype=np.int64)
+        self.logger.info(f"Indexed {len(polygons)} blocks in {len(self.cell_keys)} cells")
+
+    @classmethod
+    def from_shapefiles(cls, paths: Iterable[str], cell_size: float = constants.BLOCK_INDEX_CELL_DEGREES,
+                        tracts: Optional[Collection[int]] = None):
+        """
+        Load TIGER/Line 2020 block shapefiles, e.g. `tl_2020_17_tabblock20.shp` for Illinois. Needs `pyshp`
+        Args:
+            paths: The paths of the shapefiles, one per state
+            cell_size: The size of a cell of the grid, in degrees
+            tracts:
+                Only load the blocks of these tracts, given as 11-digit GEOIDs, e.g. the tracts of the ZIP codes of
+                an input from `ZipIndex.tracts_of`. The polygons of the other blocks are not even read
+        """
+        try:
+            import shapefile
+        except ImportError as exc:
+            raise ImportError("Reading TIGER/Line shapefiles needs pyshp, install it with `pip install pyshp`") from exc
+
+        tracts = None if tracts is None else set(int(tract) for tract in tracts)
+        polygons, states, counties, tract_codes, blocks = [], [], [], [], []
+        for path in paths:
+            with shapefile.Reader(path) as reader:
+                for i, record in enumerate(reader.iterRecords(fields=['STATEFP20', 'COUNTYFP20', 'TRACTCE20',
+                                                                      'BLOCKCE20'])):
+                    state, county, tract = int(record['STATEFP20']), int(record['COUNTYFP20']), int(record['TRACTCE20'])
+                    if tracts is not None and (state * 10 ** 9 + county * 10 ** 6 + tract) not in tracts:
+                        continue
+                    shape = reader.shape(i)
+                    points = np.asarray(shape.points, dtype=np.float64)
+                    polygons.append(np.split(points, shape.parts[1:]))
+                    states.append(state)
+                    counties.append(county)
+                    tract_codes.append(tract)
+                    blocks.append(int(record['BLOCKCE20']))
+        return cls(polygons, states, counties, tract_codes, blocks, cell_size)
+
+    def _cells(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        x, y = np.floor(np.asarray(points, dtype=np.float64) / self.cell_size).astype(np.int64).T
+        return x, y
+
+    @staticmethod
+    def _cell_key(x, y):
+        return x * 2 ** 32 + (y + 2 ** 31)
+
+    @staticmethod
+    def _concatenated_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """
+        The concatenation of `range(start, start + count)` for each start and count, without a python loop
+        """
+        ends = np.cumsum(counts)
+        return np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - counts), counts)
+
+    def lookup(self, lng: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the blocks of many coordinates at once. Every point is tested against every edge of the polygons of its
+        cell in a single pass of even-odd ray casting, `LOOKUP_BATCH` points at a time to bound the memory used
+        Args:
+            lng: Longitudes
+            lat: Latitudes
+        Returns:
+            Arrays of tract, block group and block, with -1 for coordinates outside of every indexed block
+        """
+        lng, lat = np.asarray(lng, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+        found = np.full(len(lng), -1, dtype=np.int64)
+        for batch_start in range(0, len(lng), constants.BLOCK_INDEX_LOOKUP_BATCH):
+            batch = slice(batch_start, batch_start + constants.BLOCK_INDEX_LOOKUP_BATCH)
+            found[batch] = self._find_polygons(lng[batch], lat[batch])
+
+        tracts, block_groups, blocks = np.full((3, len(lng)), -1, dtype=np.int64)
+        is_found = found >= 0
+        tracts[is_found] = self.tracts[found[is_found]]
+        blocks[is_found] = self.blocks[found[is_found]]
+        # The first digit of a block is its block group
+        block_groups[is_found] = blocks[is_found] // 1000
+        return tracts, block_groups, blocks
+
+    def _find_polygons(self, lng: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        found = np.full(len(lng), -1, dtype=np.int64)
+        if not len(self.cell_keys):
+            return found
+
+        # Pair every point with the candidate polygons of its cell
+        keys = self._cell_key(*self._cells(np.column_stack([lng, lat])))
+        positions = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+        in_grid = self.cell_keys[positions] == keys
+        counts = np.where(in_grid, self.cell_offsets[positions + 1] - self.cell_offsets[positions], 0)
+        pair_points = np.repeat(np.arange(len(lng)), counts)
+        pair_polygons = self.cell_polygons[self._concatenated_ranges(self.cell_offsets[positions], counts)]
+
+        # Pair every (point, polygon) with the edges of the polygon
+        edge_counts = self.edge_offsets[pair_polygons + 1] - self.edge_offsets[pair_polygons]
+        edge_pairs = np.repeat(np.arange(len(pair_points)), edge_counts)
+        x1, y1, x2, y2 = self.edges[self._concatenated_ranges(self.edge_offsets[pair_polygons], edge_counts)].T
+        x, y = lng[pair_points][edge_pairs], lat[pair_points][edge_pairs]
+        crosses = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_intersection = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        crossings = np.bincount(edge_pairs, weights=crosses & (x < x_intersection), minlength=len(pair_points))
+
+        inside = crossings % 2 == 1
+        found[pair_points[inside]] = pair_polygons[inside]
+        return found
+
+    def lookup_one(self, lng: float, lat: float) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+        """
+        Find the block of a coordinate
+        Returns:
+            A tuple of (tract, block group, block), or `None`s if the coordinate is outside of every indexed block
+        """
+        (tract,), (block_group,), (block,) = self.lookup(np.array([lng]), np.array([lat]))
+        if tract < 0:
+            return None, None, None
+        return int(tract), int(block_group), int(block)
@@ -0,0 +1,107 @@
+import logging
+import sqlite3
+import time
+from typing import Iterable, Optional, Tuple
+
+from src import constants
+from src.normalizer import normalize_address
+
+
+class ResultCache:
+    """
+    An on-disk cache from normalized address to its geography, so that addresses resolved in a previous run
+    are not sent to Census or Google again. Entries are stored per stage (`census` for the batch endpoint,
+    `google` for the fallback) and are invalidated when they are older than `ttl` seconds or were fetched
+    with another Census benchmark/vintage. A cache written with another layout than `CACHE_SCHEMA_VERSION` is
+    emptied when it is opened.
+    """
+
+    CENSUS = "census"
+    GOOGLE = "google"
+
+    def __init__(self, path: str = constants.CACHE_DB, ttl: float = constants.CACHE_TTL_SECONDS,
+                 vintage: str = constants.CACHE_VINTAGE):
+        self.path = path
+        self.ttl = ttl
+        self.vintage = vintage
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+        self.connection = sqlite3.connect(path)
+        schema_version, = self.connection.execute("PRAGMA user_version").fetchone()
+        if schema_version != constants.CACHE_SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS results")
+            self.connection.execute(f"PRAGMA user_version = {constants.CACHE_SCHEMA_VERSION:d}")
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS results (
+                                       stage TEXT NOT NULL,
+                                       key TEXT NOT NULL,
+                                       vintage TEXT NOT NULL,
+                                       created_at REAL NOT NULL,
+                                       tract INTEGER,
+                                       block_group INTEGER,
+                                       block INTEGER,
+                                       corrected_address TEXT,
+                                       is_matched TEXT,
+                                       state INTEGER,
+                                       county INTEGER,
+                                       PRIMARY KEY (stage, key))''')
+        self.connection.commit()
+
+    def get(self, stage: str, addr: str) -> Optional[Tuple]:
+        """
+        Look up an address
+        Args:
+            stage: `ResultCache.CENSUS` or `ResultCache.GOOGLE`
+            addr: An address, it does not need to be normalized
+        Returns:
+            A tuple of (tract, block group, block, corrected address, match flag, state, county), or None if there
+            is no valid entry
+        """
+        row = self.connection.execute('''SELECT tract, block_group, block, corrected_address, is_matched, state, county
+                                         FROM results WHERE stage = ? AND key = ? AND vintage = ? AND created_at >= ?''',
+                                      (stage, normalize_address(addr), self.vintage, time.time() - self.ttl)).fetchone()
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row
+
+    def put(self, stage: str, addr: str, tract: Optional[int], block_group: Optional[int], block: Optional[int],
+            corrected_address: Optional[str], is_matched: Optional[str], state: Optional[int] = None,
+            county: Optional[int] = None) -> None:
+        """
+        Store the geography of an address, replacing the previous entry if any
+        """
+        self.put_many(stage, [(addr, tract, block_group, block, corrected_address, is_matched, state, county)])
+
+    def put_many(self, stage: str, rows: Iterable[Tuple]) -> None:
+        """
+        Store many entries in one transaction
+        Args:
+            stage: `ResultCache.CENSUS` or `ResultCache.GOOGLE`
+            rows: Tuples of (address, tract, block group, block, corrected address, match flag, state, county)
+        """
+        now = time.time()
+        self.connection.executemany('''INSERT OR REPLACE INTO results
+                                       (stage, key, vintage, created_at, tract, block_group, block,
+                                        corrected_address, is_matched, state, county)
+                                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                                    ((stage, normalize_address(addr), self.vintage, now, *values)
+                                     for addr, *values in rows))
+        self.connection.commit()
+
+    def purge(self) -> int:
+        """
+        Delete expired entries and entries from another vintage
+        Returns:
+            The number of deleted entries
+        """
+        cursor = self.connection.execute("DELETE FROM results WHERE vintage != ? OR created_at < ?",
+                                         (self.vintage, time.time() - self.ttl))
+        self.connection.commit()
+        self.logger.info(f"Purged {cursor.rowcount} stale entries from the cache")
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self.logger.info(f"Cache hits: {self.hits}, misses: {self.misses}")
+        self.connection.close()
@@ -0,0 +1,30 @@
+import functools
+import logging
+
+from src import constants
+
+
+@functools.lru_cache(maxsize=None)
+def load_secret(path: str = constants.SECRET_FILE) -> dict:
+    """
+    Read the API keys in path, once per process: every `DataHandler` and `Geocoder` shares the parsed file. Needs
+    `pyyaml`, which is only imported here
+    """
+    import yaml
+    with open(path, "r") as stream:
+        return yaml.safe_load(stream)
+
+
+def census_key() -> str:
+    return load_secret()['key']['census_api']
+
+
+def google_key() -> str:
+    return load_secret()['key']['google_api']
+
+
+def configure_logging() -> None:
+    """
+    Log with `LOGGING_FORMAT` at `LOGGING_LEVEL`, unless logging was configured already
+    """
+    logging.basicConfig(format=constants.LOGGING_FORMAT, level=constants.LOGGING_LEVEL)
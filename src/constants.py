@@ -1,9 +1,101 @@
 import logging
 
-MAX_LINES_ALLOWED_CENSUS = 1500  # 10000
+MAX_LINES_ALLOWED_CENSUS = 10000  # Limit of the Census batch API
+MAX_BATCHES_IN_FLIGHT = 8  # Census batches read from the input and awaiting a response at any time
+# Census batches start with these sizes, then `BatchTuner` adapts them to the observed response times
+CENSUS_INITIAL_BATCH_SIZE = 1500
+CENSUS_INITIAL_BATCHES_IN_FLIGHT = 2
+CENSUS_MIN_BATCH_SIZE = 100
+CENSUS_TARGET_BATCH_SECONDS = 60
+CENSUS_TUNER_SMOOTHING = 0.3
+CENSUS_BATCH_TIMEOUT_SECONDS = 300  # A batch taking longer is split in two and submitted again
 LOGGING_LEVEL = logging.DEBUG  # DEBUG/INFO for more/less detailed log
+LOGGING_FORMAT = '%(asctime)s %(levelname)s %(filename)s:%(lineno)d %(message)s'
+SECRET_FILE = "secret.yaml"  # The Census and Google API keys, under `key: census_api` and `key: google_api`
 CENSUS_BATCH_URL = "https://geocoding.geo.census.gov/geocoder/geographies/addressbatch"
 CENSUS_GEOCODER_FROM_COORD = "https://geocoding.geo.census.gov/geocoder/geographies/coordinates"
+GOOGLE_BASE_URL = "https://maps.googleapis.com"
+# For benchmark, we use ACS layers numbering, documented at Page C-1 in appendix in
+# https://www2.census.gov/geo/pdfs/maps-data/data/Census_Geocoder_User_Guide.pdf.
+CENSUS_BENCHMARK = "Public_AR_Current"
+CENSUS_VINTAGE = "4"
 
 TEMP_UNMATCH_CSV = "unmatched_census.csv"
 TEMP_MATCH_CSV = "matched_census.csv"
+JOURNAL_SUFFIX = ".journal.sqlite"  # The progress of `<input>` is recorded in `<input>.journal.sqlite`
+GOOGLE_JOURNAL_ROWS = 500  # Rows of the Google stage recorded together in the journal
+
+CACHE_DB = "geocode_cache.sqlite"
+CACHE_TTL_SECONDS = 30 * 24 * 3600  # Cached results older than this are fetched again
+CACHE_VINTAGE = f"{CENSUS_BENCHMARK}/{CENSUS_VINTAGE}"  # Cached results from another vintage are fetched again
+CACHE_SCHEMA_VERSION = 2  # A cache written with another layout of its table is emptied
+
+# Scheduling of the Google/Census fallback stage
+GOOGLE_UPSTREAM = "google"
+CENSUS_COORD_UPSTREAM = "census_coordinates"
+MAX_IN_FLIGHT_REQUESTS = 50
+RATE_LIMITS_PER_SECOND = {GOOGLE_UPSTREAM: 50, CENSUS_COORD_UPSTREAM: 20}
+MIN_RATE_PER_SECOND = 1  # A throttled upstream is never slowed down below this
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+GOOGLE_EXECUTOR_WORKERS = 32  # Threads running the blocking Google client
+
+# The HTTP session shared by both stages, see `http_client.create_session`
+HTTP_MAX_CONNECTIONS = 100
+# Both stages call the same Census host, this leaves room for every request in flight of both
+HTTP_MAX_CONNECTIONS_PER_HOST = MAX_IN_FLIGHT_REQUESTS + MAX_BATCHES_IN_FLIGHT
+HTTP_KEEPALIVE_SECONDS = 60
+HTTP_DNS_CACHE_SECONDS = 600
+HTTP_TOTAL_TIMEOUT_SECONDS = None  # Census batches are already bounded by CENSUS_BATCH_TIMEOUT_SECONDS
+HTTP_CONNECT_TIMEOUT_SECONDS = 30
+HTTP_READ_TIMEOUT_SECONDS = CENSUS_BATCH_TIMEOUT_SECONDS  # Census sends nothing until a whole batch is geocoded
+HTTP_ACCEPT_COMPRESSED = True
+
+# Service mode, see `service.GeocodingService`
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_BATCH_WINDOW_SECONDS = 0.05  # Addresses arriving within this window are sent to Census in the same batch
+SERVICE_MAX_BATCH_SIZE = 1000  # A batch is sent as soon as it has this many addresses
+
+# Prefilter of addresses whose ZIP is not in their state, see `prefilter.ZipIndex`
+PREFILTERED_SUFFIX = ".prefiltered.csv"  # The rows of `<input>` kept by the prefilter are written to this file
+
+BLOCK_INDEX_CELL_DEGREES = 0.01  # Size of the grid cells of the offline block lookup, about 1 km
+BLOCK_INDEX_LOOKUP_BATCH = 65536  # Coordinates looked up together, bounds the memory of the offline block lookup
+
+METRICS_PREFIX = "zipcodes"  # Prefix of the exported Prometheus metrics
+METRICS_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)  # In seconds
+
+# Canonical forms used to find duplicated addresses, from https://pe.usps.com/text/pub28/28apc_002.htm
+STREET_SUFFIXES = {'ALLEY': 'ALY', 'AVENUE': 'AVE', 'BOULEVARD': 'BLVD', 'CIRCLE': 'CIR', 'COURT': 'CT',
+                   'DRIVE': 'DR', 'EXPRESSWAY': 'EXPY', 'FREEWAY': 'FWY', 'HIGHWAY': 'HWY', 'LANE': 'LN',
+                   'PARKWAY': 'PKWY', 'PLACE': 'PL', 'PLAZA': 'PLZ', 'ROAD': 'RD', 'SQUARE': 'SQ', 'STREET': 'ST',
+                   'TERRACE': 'TER', 'TRAIL': 'TRL', 'TURNPIKE': 'TPKE', 'WAY': 'WAY'}
+DIRECTIONS = {'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+              'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW'}
+STATE_NAMES = {'ALABAMA': 'AL', 'ALASKA': 'AK', 'ARIZONA': 'AZ', 'ARKANSAS': 'AR', 'CALIFORNIA': 'CA',
+               'COLORADO': 'CO', 'CONNECTICUT': 'CT', 'DELAWARE': 'DE', 'DISTRICT OF COLUMBIA': 'DC', 'FLORIDA': 'FL',
+               'GEORGIA': 'GA', 'HAWAII': 'HI', 'IDAHO': 'ID', 'ILLINOIS': 'IL', 'INDIANA': 'IN', 'IOWA': 'IA',
+               'KANSAS': 'KS', 'KENTUCKY': 'KY', 'LOUISIANA': 'LA', 'MAINE': 'ME', 'MARYLAND': 'MD',
+               'MASSACHUSETTS': 'MA', 'MICHIGAN': 'MI', 'MINNESOTA': 'MN', 'MISSISSIPPI': 'MS', 'MISSOURI': 'MO',
+               'MONTANA': 'MT', 'NEBRASKA': 'NE', 'NEVADA': 'NV', 'NEW HAMPSHIRE': 'NH', 'NEW JERSEY': 'NJ',
+               'NEW MEXICO': 'NM', 'NEW YORK': 'NY', 'NORTH CAROLINA': 'NC', 'NORTH DAKOTA': 'ND', 'OHIO': 'OH',
+               'OKLAHOMA': 'OK', 'OREGON': 'OR', 'PENNSYLVANIA': 'PA', 'RHODE ISLAND': 'RI', 'SOUTH CAROLINA': 'SC',
+               'SOUTH DAKOTA': 'SD', 'TENNESSEE': 'TN', 'TEXAS': 'TX', 'UTAH': 'UT', 'VERMONT': 'VT',
+               'VIRGINIA': 'VA', 'WASHINGTON': 'WA', 'WEST VIRGINIA': 'WV', 'WISCONSIN': 'WI', 'WYOMING': 'WY',
+               'PUERTO RICO': 'PR'}
+ADDRESS_MEMO_SIZE = 2 ** 20  # Addresses whose canonical form or tags are memoized
+DEDUPLICATED_SUFFIX = ".unique.csv"  # The unique addresses of `<input>` are written to `<input>.unique.csv`
+SHARDS_SUFFIX = ".shards"  # With several workers, `<input>` is split into `<input>.shards/shard_<i>.csv`
+# In delta mode, the rows of `<input>` added or changed since the previous input are written to `<input>.changed.csv`,
+# the results of the other rows are carried forward from the previous finished file to `<input>.carried.<format>`
+DELTA_CHANGED_SUFFIX = ".changed.csv"
+DELTA_CARRIED_SUFFIX = ".carried"
+STATE_FIPS = {'AL': 1, 'AK': 2, 'AZ': 4, 'AR': 5, 'CA': 6, 'CO': 8, 'CT': 9, 'DE': 10, 'DC': 11, 'FL': 12, 'GA': 13,
+              'HI': 15, 'ID': 16, 'IL': 17, 'IN': 18, 'IA': 19, 'KS': 20, 'KY': 21, 'LA': 22, 'ME': 23, 'MD': 24,
+              'MA': 25, 'MI': 26, 'MN': 27, 'MS': 28, 'MO': 29, 'MT': 30, 'NE': 31, 'NV': 32, 'NH': 33, 'NJ': 34,
+              'NM': 35, 'NY': 36, 'NC': 37, 'ND': 38, 'OH': 39, 'OK': 40, 'OR': 41, 'PA': 42, 'RI': 44, 'SC': 45,
+              'SD': 46, 'TN': 47, 'TX': 48, 'UT': 49, 'VT': 50, 'VA': 51, 'WA': 53, 'WV': 54, 'WI': 55, 'WY': 56,
+              'PR': 72}
@@ -1,14 +1,19 @@
 import asyncio
 import io
 import logging
-import tempfile
+import time
+from typing import AsyncIterator, Optional, Tuple
 
 import aiohttp
 import numpy as np
 import pandas as pd
-import yaml
 
-from src import constants
+from src import config, constants
+from src.batch_tuner import BatchTuner
+from src.cache import ResultCache
+from src.http_client import session_scope
+from src.journal import Journal
+from src.metrics import Metrics
 
 
 class DataHandler:
@@ -17,17 +22,30 @@ class DataHandler:
     1. Splitting a big files to chunks
     2. Upload those chunks to Census batch
     3. Join them together at the end
+
+    If a `ResultCache` is given, addresses found in it are not uploaded again. The size of the batches and how many of
+    them are in flight are adapted by a `BatchTuner`, exposed as `self.tuner`. The requests to Census and the parsing
+    of their responses are timed in `self.metrics`
     """
 
-    def __init__(self):
-        with open("secret.yaml", "r") as stream:
-            try:
-                secret = yaml.safe_load(stream)
-            except yaml.YAMLError as exc:
-                print(exc)
-        self.census_key = secret['key']['census_api']
+    CENSUS_COLUMNS = ['ID', 'Street address', 'is_matched', 'match_type', 'cleaned_address', 'lat_lon',
+                      'tigerLine_id', 'side', 'state', 'county', 'tract', 'block']
+    # The columns of a Census response that are kept, with their types. `ID` is parsed like the input file was, so
+    # that it can be compared with the IDs of the rows sent
+    CENSUS_TYPES = {'Street address': 'string', 'is_matched': pd.CategoricalDtype(['Match', 'No_Match', 'Tie']),
+                    'cleaned_address': 'string', 'state': 'Int8', 'county': 'Int16', 'tract': 'Int32',
+                    'block': 'Int16'}
+    PARSED_COLUMNS = ['ID', *CENSUS_TYPES]
+    RESULT_COLUMNS = ['ID', 'Street address', 'is_matched', 'corrected_address', 'state', 'county', 'tract', 'block']
+
+    def __init__(self, cache: Optional[ResultCache] = None, tuner: Optional[BatchTuner] = None,
+                 census_key: Optional[str] = None, metrics: Optional[Metrics] = None):
+        self.census_key = census_key or config.census_key()
+        self.cache = cache
+        self.tuner = tuner or BatchTuner()
+        self.metrics = metrics or Metrics()
         self.logger = logging.getLogger(__name__)
-        logging.basicConfig(format='%(asctime)s %(levelname)s %(filename)s:%(lineno)d %(message)s', level=constants.LOGGING_LEVEL)
+        config.configure_logging()
 
     def append_to_table(self, original_address_table: pd.DataFrame, tract_blkgrp_blk: list) -> pd.DataFrame:
         """
@@ -55,28 +73,226 @@ class DataHandler:
             session:
                 An async http session to make a request
         Returns:
+            The Census response as a dataframe with the columns in `PARSED_COLUMNS`
+        """
+        if self.cache is None:
+            return await self._upload_to_census(chunk, session)
+
+        addresses = chunk.iloc[:, 1:5].astype(str).agg(', '.join, axis=1)
+        cached = [self.cache.get(ResultCache.CENSUS, addr) for addr in addresses]
+        is_cached = np.array([entry is not None for entry in cached], dtype=bool)
+        cached_df = pd.DataFrame([(row_id, addr, entry[4], entry[3], entry[5], entry[6], entry[0], entry[2])
+                                  for row_id, addr, entry in zip(chunk.iloc[:, 0], addresses, cached) if entry],
+                                 columns=self.PARSED_COLUMNS).astype(self.CENSUS_TYPES)
+        if is_cached.all():
+            return cached_df
+
+        response_df = await self._upload_to_census(chunk[~is_cached], session)
+        address_by_id = dict(zip(chunk.iloc[:, 0], addresses))
+        to_cache = []
+        for row in response_df.itertuples(index=False):
+            if row.ID not in address_by_id or pd.isna(row.is_matched):
+                continue
+            state, county, tract, block = (int(code) if pd.notna(code) else None
+                                           for code in (row.state, row.county, row.tract, row.block))
+            block_group = block // 1000 if block is not None else None
+            corrected_address = row.cleaned_address if pd.notna(row.cleaned_address) else None
+            to_cache.append((address_by_id[row.ID], tract, block_group, block, corrected_address, row.is_matched,
+                             state, county))
+        self.cache.put_many(ResultCache.CENSUS, to_cache)
+        return pd.concat([cached_df, response_df]) if len(cached_df) else response_df
+
+    async def _upload_to_census(self, chunk, session: aiohttp.ClientSession):
+        """
+        Upload a chunk to the Census batch endpoint. The chunk is serialized into an in-memory buffer which is sent as
+        the multipart file, and the response bytes are parsed as they are, without going through the disk or a `str`
+        Args:
+            chunk:
+                A chunk of frame taken from the original big input file
+            session:
+                An async http session to make a request
+        Returns:
+            The Census response as a dataframe with the columns in `PARSED_COLUMNS`
+        """
+        address_file = io.BytesIO()
+        chunk.to_csv(address_file, index=False, header=False)
+        address_file.seek(0)
+        form = aiohttp.FormData()
+        form.add_field('addressFile', address_file, filename='addresses.csv', content_type='text/csv')
+        form.add_field('benchmark', constants.CENSUS_BENCHMARK)
+        form.add_field('vintage', constants.CENSUS_VINTAGE)
+        # For layers, 8 is for tracts, 10 is for block groups, and 12 is for blocks.
+        form.add_field('layers', '10,12')
+        form.add_field('key', self.census_key)
+        self.logger.info("A batch has been submitted, awaiting response...")
+        with self.metrics.time(Metrics.CENSUS_BATCH):
+            async with session.post(constants.CENSUS_BATCH_URL, data=form) as response:
+                response_body = await response.read()
+        self.metrics.count(Metrics.BYTES_SENT, address_file.getbuffer().nbytes, stage=Metrics.CENSUS_BATCH)
+        self.metrics.count(Metrics.BYTES_RECEIVED, len(response_body), stage=Metrics.CENSUS_BATCH)
+        with self.metrics.time(Metrics.CENSUS_BATCH_PARSE):
+            return self.parse_census_response(response_body)
+
+    @classmethod
+    def parse_census_response(cls, response_body: bytes) -> pd.DataFrame:
+        """
+        Parse the CSV returned by the Census batch endpoint, with the columns in `CENSUS_COLUMNS` and no header.
+        Unmatched and tie rows only have their first 3 fields. Only the columns in `PARSED_COLUMNS` are kept, and they
+        are parsed into `CENSUS_TYPES` without going through an object array. The codes are parsed as float32, which holds codes of up to 7 digits exactly and is about
+        twice faster to parse than the nullable integers they are then cast to
+        """
+        parse_types = {column: 'float32' if str(dtype).startswith('Int') else dtype
+                       for column, dtype in cls.CENSUS_TYPES.items()}
+        # No `usecols`, which fails on a response where no row has all the fields
+        census_df = pd.read_csv(io.BytesIO(response_body), header=None, names=cls.CENSUS_COLUMNS, dtype=parse_types)
+        return census_df[cls.PARSED_COLUMNS].astype(cls.CENSUS_TYPES)
+
+    def _shape_census_result(self, census_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Keep the interesting columns of a Census response
+        Args:
+            census_df:
+                A Census response with the columns in `PARSED_COLUMNS`, or all the columns in `CENSUS_COLUMNS`
+        Returns:
+            A df with the columns in `RESULT_COLUMNS`
+        """
+        result_with_columns = census_df[self.PARSED_COLUMNS].astype(self.CENSUS_TYPES)
+        result_with_columns.columns = self.RESULT_COLUMNS
+        for is_matched, count in result_with_columns['is_matched'].value_counts().items():
+            if count:
+                self.metrics.count(Metrics.RESULTS, count, stage=Metrics.CENSUS_BATCH, result=is_matched)
+        return result_with_columns
+
+    @staticmethod
+    def partition(result_with_columns: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Split a result into its matched rows and the others, unmatched or tie, with a single copy of the rows
+        Args:
+            result_with_columns:
+                A df with the columns in `RESULT_COLUMNS`
+        Returns:
+            The matched rows and the other rows, without the `is_matched` column and in their original order
+        """
+        is_matched = (result_with_columns['is_matched'] == 'Match').to_numpy(dtype=bool, na_value=False)
+        # Matched rows first, then the others, each in their original order
+        order = np.argsort(~is_matched, kind='stable')
+        rows = result_with_columns.drop(columns='is_matched').take(order)
+        matched_count = int(is_matched.sum())
+        return rows.iloc[:matched_count], rows.iloc[matched_count:]
+
+    async def _timed_post_batch_to_census(self, chunk, session: aiohttp.ClientSession):
+        """
+        `_post_batch_to_census` with a timeout of CENSUS_BATCH_TIMEOUT_SECONDS
+        Returns:
+            A tuple of the Census response and the seconds it took
+        """
+        started = time.monotonic()
+        response = await asyncio.wait_for(self._post_batch_to_census(chunk, session),
+                                          constants.CENSUS_BATCH_TIMEOUT_SECONDS)
+        return response, time.monotonic() - started
+
+    async def process_batch(self, chunk, session: aiohttp.ClientSession) -> pd.DataFrame:
+        """
+        Push a single chunk to Census, through the cache and with the timeout of `iter_batches`
+        Args:
+            chunk:
+                A df with the columns `Unique ID`, `Street address`, `City`, `State`, `ZIP`
+            session:
+                An async http session to make a request
+        Returns:
+            A df with the columns in `RESULT_COLUMNS`
+        """
+        response, _ = await self._timed_post_batch_to_census(chunk, session)
+        return self._shape_census_result(response)
 
+    async def iter_batches(self, filename: str, session: aiohttp.ClientSession, max_in_flight: Optional[int] = None,
+                           journal: Optional[Journal] = None) -> AsyncIterator[pd.DataFrame]:
+        """
+        Split filename into batches, push them to Census and yield the results as soon as each batch returns.
+        Only the batches in flight are read from the file, so that the memory used does not depend on its size.
+        The size of the batches and how many are in flight are chosen by `self.tuner`, and a batch that times out
+        is split in two halves which are submitted again
+        Args:
+            filename:
+                The big CSV file name to parse, see `batch_process_csv`
+            session:
+                An async http session to make requests
+            max_in_flight:
+                If given, the maximum number of batches submitted and not returned yet, instead of the tuned one
+            journal:
+                If given, rows already finished in the journal are skipped, and every returned batch is recorded
+        Raises:
+            RuntimeError: once every batch returned, if some of them failed
+        Returns:
+            An async iterator of dfs with the columns in `RESULT_COLUMNS`, in the order the batches return
         """
-        with tempfile.NamedTemporaryFile(suffix='.csv') as tmp:
-            chunk.to_csv(tmp.name, index=False, header=False)
-            files = {
-                'addressFile': open(tmp.name, 'rb'),
-                # For benchmark, we use ACS layers numbering, documented at Page C-1 in appendix in
-                # https://www2.census.gov/geo/pdfs/maps-data/data/Census_Geocoder_User_Guide.pdf.
-                'benchmark': 'Public_AR_Current',
-                'vintage': '4',
-                # For layers, 8 is for tracts, 10 is for block groups, and 12 is for blocks.
-                'layers': '10,12',
-                'key': self.census_key
-            }
-            self.logger.info("A batch has been submitted, awaiting response...")
-            response = await session.post(constants.CENSUS_BATCH_URL, data=files)
-            response_text = await response.text()
-            return pd.read_csv(io.StringIO(response_text), header=None,
-                               names=['ID', 'Street address', 'is_matched', 'match_type', 'cleaned_address', 'lat_lon',
-                                      'tigerLine_id', 'side', 'state', 'county', 'tract', 'block'])
-
-    async def batch_process_csv(self, filename: str) -> pd.DataFrame:
+        self.logger.info("Starting to submit batches to Census API")
+        pending = {}
+        to_resubmit = []
+        failed = []
+
+        def submit(start, stop, chunk):
+            pending[asyncio.create_task(self._timed_post_batch_to_census(chunk, session))] = (start, stop, chunk)
+
+        def has_room():
+            return len(pending) < (max_in_flight or self.tuner.max_in_flight)
+
+        async def wait_first():
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            results = []
+            for task in done:
+                start, stop, chunk = pending.pop(task)
+                exception = task.exception()
+                if isinstance(exception, asyncio.TimeoutError) and len(chunk) > 1:
+                    self.logger.warning(f"The batch of rows {start} to {stop} timed out, splitting it in two")
+                    self.tuner.record_timeout()
+                    middle = len(chunk) // 2
+                    to_resubmit.append((start, start + middle, chunk.iloc[:middle]))
+                    to_resubmit.append((start + middle, stop, chunk.iloc[middle:]))
+                    continue
+                if exception is not None:
+                    # Keep going with the other batches, the failed rows are retried by the next run
+                    self.logger.error(f"The batch of rows {start} to {stop} failed: {exception!r}")
+                    failed.append((start, stop))
+                    continue
+                response, seconds = task.result()
+                self.tuner.record_success(len(chunk), seconds)
+                result_with_columns = self._shape_census_result(response)
+                if journal is not None:
+                    journal.record(Journal.CENSUS, start, stop, result_with_columns)
+                results.append(result_with_columns)
+            return results
+
+        try:
+            offset, exhausted = 0, False
+            with pd.read_csv(filename, header=None, iterator=True) as reader:
+                while pending or to_resubmit or not exhausted:
+                    if to_resubmit and has_room():
+                        submit(*to_resubmit.pop(0))
+                    elif not exhausted and has_room():
+                        try:
+                            chunk = reader.get_chunk(self.tuner.batch_size)
+                        except StopIteration:
+                            exhausted = True
+                            continue
+                        ranges = [(offset, offset + len(chunk))]
+                        if journal is not None:
+                            ranges = journal.pending_ranges(Journal.CENSUS, *ranges[0])
+                        for start, stop in ranges:
+                            submit(start, stop, chunk.iloc[start - offset:stop - offset])
+                        offset += len(chunk)
+                    else:
+                        for result_with_columns in await wait_first():
+                            yield result_with_columns
+        finally:
+            for task in pending:
+                task.cancel()
+        if failed:
+            raise RuntimeError(f"{len(failed)} batches failed, run the program again to retry them")
+        self.logger.info(f"Finished submitting batches to Census API, they settled at {self.tuner.batch_size} rows "
+                         f"and {self.tuner.max_in_flight} in flight\n---------------")
+
+    async def batch_process_csv(self, filename: str, session: Optional[aiohttp.ClientSession] = None) -> pd.DataFrame:
         """
         Split filename into batches and push them to Census
         Args:
@@ -84,25 +300,13 @@ class DataHandler:
                 The big CSV file name to parse, required to have the columns addressed in
                 https://geocoding.geo.census.gov/geocoder/Geocoding_Services_API.html#_Toc7768597.
                 Namely, the columns are `Unique ID` (Just as a reference), `Street address`, `City`, `State`, `ZIP`
+            session:
+                The session to make requests with, a new one from `http_client.create_session` if not given
         Returns:
             A concatenated df with column names from list of processed dataframes
         """
-        async with aiohttp.ClientSession() as session:
-            self.logger.info("Starting to submit batches to Census API")
-            processed_dfs = await asyncio.gather(*(self._post_batch_to_census(chunk, session)
-                                                   for chunk in pd.read_csv(filename,
-                                                                            chunksize=constants.MAX_LINES_ALLOWED_CENSUS,
-                                                                            header=None)))
-            self.logger.info("Finished submitting batches to Census API\n---------------")
-
-            all_result_after_census = pd.concat(processed_dfs)
-
-            # The index of columns in the next lines is the interested column fron Census returned CSVs.
-            # Their columns are:
-            #  ['ID', 'Street address', 'is_matched', 'match_type', 'cleaned_address',
-            #  'lat_lon', 'tigerLine_id', 'side', 'state', 'county', 'tract', 'block']
-            result_with_columns = pd.DataFrame(data=all_result_after_census.iloc[:, [0, 1, 2, 4, -2, -1]].values,
-                                               columns=['ID', 'Street address', 'is_matched', 'corrected_address', 'tract', 'block'])
-            result_with_columns['tract'] = result_with_columns['tract'].astype("Int64")
-            result_with_columns['block'] = result_with_columns['block'].astype("Int64")
-            return result_with_columns
+        async with session_scope(session) as session:
+            processed_dfs = [result_with_columns async for result_with_columns in self.iter_batches(filename, session)]
+        if not processed_dfs:
+            return pd.DataFrame(columns=self.RESULT_COLUMNS)
+        return pd.concat(processed_dfs, ignore_index=True)
@@ -0,0 +1,99 @@
+import logging
+import os
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+from src.normalizer import row_id_key
+from src.result_files import ResultWriter, iter_results, read_results, result_columns
+
+
+def delta_paths(filename: str, output_format: str = 'csv') -> Tuple[str, str]:
+    """
+    Returns:
+        The paths of the changed rows and of the carried forward results of filename
+    """
+    return (filename + constants.DELTA_CHANGED_SUFFIX,
+            filename + constants.DELTA_CARRIED_SUFFIX + '.' + output_format)
+
+
+def address_hashes(chunk: pd.DataFrame) -> np.ndarray:
+    """
+    A 64-bit hash of the `Street address`, `City`, `State` and `ZIP` of each row, as they are written
+    """
+    return pd.util.hash_pandas_object(chunk.iloc[:, 1:5], index=False).to_numpy()
+
+
+def _previous_hashes(previous_filename: str, ids: set, chunksize: int) -> pd.Series:
+    """
+    The address hashes of the rows of previous_filename whose `row_id_key` is one of ids, indexed by that key. IDs
+    found more than once are left out, since we cannot tell which of their rows a result belongs to
+    """
+    hashes = []
+    with pd.read_csv(previous_filename, header=None, dtype=str, keep_default_na=False,
+                     chunksize=chunksize) as reader:
+        for chunk in reader:
+            keys = chunk[0].map(row_id_key)
+            is_finished = keys.isin(ids)
+            hashes.append(pd.Series(address_hashes(chunk[is_finished]), index=keys[is_finished].to_numpy()))
+    hashes = pd.concat(hashes) if hashes else pd.Series([], dtype=np.uint64)
+    return hashes[~hashes.index.duplicated(keep=False)]
+
+
+def split_delta(filename: str, previous_filename: str, previous_finished: str, output_format: str = 'csv',
+                chunksize: int = constants.MAX_LINES_ALLOWED_CENSUS) -> Tuple[str, str]:
+    """
+    Compare filename with the previous version of the same file by ID and by the hash of the address columns. Rows
+    that are new, or whose address changed, are copied to the changed file, to be geocoded. The results of the other
+    rows are copied from previous_finished to the carried file, a chunk at a time. A row without a result in
+    previous_finished counts as changed, so that rows that failed the previous run are geocoded again. IDs are
+    compared by their `row_id_key`, since the IDs of previous_finished were parsed again by Census.
+
+    The files of an interrupted run are kept as they are, unless one of the inputs changed since they were written
+    Args:
+        filename:
+            The CSV file with the columns `Unique ID`, `Street address`, `City`, `State`, `ZIP` and no header
+        previous_filename:
+            The previous version of filename, in the same format
+        previous_finished:
+            The finished file of previous_filename, in any of the result formats
+        output_format:
+            The format of the carried file
+        chunksize:
+            The rows read at a time
+    Returns:
+        The paths of the changed file, in the same format as filename, and of the carried file
+    """
+    changed_path, carried_path = delta_paths(filename, output_format)
+    sources = [filename, previous_filename, previous_finished]
+    if os.path.exists(changed_path) and os.path.exists(carried_path) and \
+            os.path.getmtime(changed_path) >= max(os.path.getmtime(source) for source in sources):
+        logging.info(f"Reusing the changed rows of {filename} from the previous run")
+        return changed_path, carried_path
+
+    finished_ids = set(read_results(previous_finished, columns=['ID'])['ID'].map(row_id_key))
+    previous = _previous_hashes(previous_filename, finished_ids, chunksize)
+    previous_ids = pd.Index(previous.index)
+
+    unchanged_ids = set()
+    partial_path = changed_path + '.partial'
+    open(partial_path, 'w').close()
+    with pd.read_csv(filename, header=None, dtype=str, keep_default_na=False, chunksize=chunksize) as reader:
+        for chunk in reader:
+            keys = chunk[0].map(row_id_key)
+            positions = previous_ids.get_indexer(keys)
+            is_unchanged = positions >= 0
+            is_unchanged[is_unchanged] = previous.to_numpy()[positions[is_unchanged]] == address_hashes(
+                chunk[is_unchanged])
+            unchanged_ids.update(keys[is_unchanged])
+            chunk[~is_unchanged].to_csv(partial_path, mode='a', header=False, index=False)
+
+    with ResultWriter(carried_path, result_columns(previous_finished)) as writer:
+        for results in iter_results(previous_finished):
+            writer.write(results[results['ID'].map(row_id_key).isin(unchanged_ids)])
+    # Renamed at the end, so that a split interrupted halfway is not mistaken for a finished one
+    os.replace(partial_path, changed_path)
+    logging.info(f"{len(unchanged_ids)} rows of {filename} are unchanged and their results are carried forward")
+    return changed_path, carried_path
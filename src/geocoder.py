@@ -1,27 +1,84 @@
+import asyncio
+import json
 import logging
-from typing import Dict, List, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import aiohttp
 import googlemaps
-import usaddress
-import yaml
+import googlemaps.exceptions
 
-from src import constants
+from src import config, constants
+from src.block_index import BlockIndex
+from src.cache import ResultCache
+from src.metrics import Metrics
+from src.scheduler import Scheduler
+from src.verifier import verify_address
 
 
 class Geocoder:
+    """
+    This class handle the second stage of the workflow, for addresses that Census could not match:
+    1. Get the coordinate of an address from Google
+    2. Get the tract, block group and block of that coordinate from Census
 
-    def __init__(self):
-        with open("secret.yaml", "r") as stream:
-            try:
-                secret = yaml.safe_load(stream)
-            except yaml.YAMLError as exc:
-                print(exc)
-        self.gmaps = googlemaps.Client(key=secret['key']['google_api'])
-        self.census_key = secret['key']['census_api']
+    If a `ResultCache` is given, addresses found in it are not looked up again. Requests go through a `Scheduler`,
+    which should be shared by every `Geocoder` talking to the same upstreams. Since the Google client is blocking,
+    it runs in a pool of `executor_workers` threads, each with its own client. If a `BlockIndex` is given, the block of
+    a coordinate is looked up in it first and Census is only called for coordinates outside of the indexed blocks.
+    Every request and step is timed in `self.metrics`
+    """
+
+    def __init__(self, cache: Optional[ResultCache] = None, scheduler: Optional[Scheduler] = None,
+                 executor_workers: int = constants.GOOGLE_EXECUTOR_WORKERS, block_index: Optional[BlockIndex] = None,
+                 google_key: Optional[str] = None, census_key: Optional[str] = None,
+                 metrics: Optional[Metrics] = None):
+        self.google_key = google_key or config.google_key()
+        self.thread_local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='google')
+        self.census_key = census_key or config.census_key()
+        self.cache = cache
+        self.metrics = metrics or Metrics()
+        self.scheduler = scheduler or Scheduler(metrics=self.metrics)
+        self.block_index = block_index
         self.logger = logging.getLogger(__name__)
-        logging.basicConfig(format='%(asctime)s %(levelname)s %(filename)s:%(lineno)d %(message)s',
-                            level=constants.LOGGING_LEVEL)
+        config.configure_logging()
+
+    @property
+    def gmaps(self) -> googlemaps.Client:
+        """
+        The Google client of the current thread, since `requests` sessions should not be shared between threads
+        """
+        if not hasattr(self.thread_local, 'gmaps'):
+            self.thread_local.gmaps = googlemaps.Client(key=self.google_key, base_url=constants.GOOGLE_BASE_URL,
+                                                        connect_timeout=constants.HTTP_CONNECT_TIMEOUT_SECONDS,
+                                                        read_timeout=constants.HTTP_READ_TIMEOUT_SECONDS,
+                                                        # Raised at once instead, so that `Scheduler` slows down
+                                                        retry_over_query_limit=False,
+                                                        requests_kwargs={'hooks': {
+                                                            'response': self._count_google_bytes}})
+        return self.thread_local.gmaps
+
+    def _count_google_bytes(self, response, *args, **kwargs) -> None:
+        """
+        A `requests` hook counting the bytes of each Google request and response
+        """
+        self.metrics.count(Metrics.BYTES_SENT, len(response.request.url), stage=Metrics.GOOGLE_GEOCODE)
+        self.metrics.count(Metrics.BYTES_RECEIVED, len(response.content), stage=Metrics.GOOGLE_GEOCODE)
+
+    @staticmethod
+    def _is_google_throttled(exc: BaseException) -> bool:
+        """
+        If an exception of the Google client means that Google throttled us, with a 429 or an `OVER_QUERY_LIMIT`
+        status, see https://developers.google.com/maps/documentation/geocoding/requests-geocoding#StatusCodes
+        """
+        if isinstance(exc, googlemaps.exceptions.HTTPError):
+            return exc.status_code == 429
+        return isinstance(exc, googlemaps.exceptions.ApiError) and exc.status == 'OVER_QUERY_LIMIT'
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
 
     def _call_api_from_addr_to_lng_lat(self, addr: str):
         """
@@ -31,9 +88,8 @@ class Geocoder:
 
         This code, therefore, would take the first result or outputs None if Google or Census cannot find anything
 
-        This code is not async because
-        1/ Google uses `requests` and hence does not support it atm of writing
-        2/ the Census request later down the flow should be awaited instead.
+        This code is blocking because Google uses `requests`, `_geocode_in_executor` should be awaited instead
+        so that the event loop keeps serving other addresses in the meantime.
 
         Args:
             addr: An address to get lat_long from
@@ -41,11 +97,22 @@ class Geocoder:
             A tuple that contains the (lat, long) value of given address
         """
         self.logger.debug("Begin to call Google API")
-        geocode_result = self.gmaps.geocode(addr)
-        # await asyncio.sleep(3)
+        with self.metrics.time(Metrics.GOOGLE_GEOCODE):
+            geocode_result = self.gmaps.geocode(addr)
         self.logger.debug("Finish calling Google API")
         return geocode_result
 
+    async def _geocode_in_executor(self, addr: str):
+        """
+        Run `_call_api_from_addr_to_lng_lat` in the thread pool
+        Args:
+            addr: An address to get lat_long from
+        Returns:
+            The Google response
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._call_api_from_addr_to_lng_lat, addr)
+
     async def _call_api_from_lat_lng_to_block(self, lng: float, lat: float, session: aiohttp.ClientSession):
         """
         Use the lng lat to tract, block data using Census API
@@ -65,7 +132,9 @@ class Geocoder:
             'format': "json",
             'key': self.census_key
         }
-        response = await session.get(constants.CENSUS_GEOCODER_FROM_COORD, params=params)
+        with self.metrics.time(Metrics.CENSUS_COORDINATES):
+            response = await session.get(constants.CENSUS_GEOCODER_FROM_COORD, params=params)
+        self.metrics.count(Metrics.BYTES_SENT, len(str(response.url)), stage=Metrics.CENSUS_COORDINATES)
         # await asyncio.sleep(2)
         self.logger.debug("Finish calling Census API.")
         return response
@@ -83,8 +152,10 @@ class Geocoder:
         self.logger.debug("Begin parsing Census API")
         tract, block_group, block = None, None, None
         if response.status == 200:
-            response_result = await response.json()
-            response_result = response_result.get('result')
+            # The body is read once, to count its bytes and to parse it
+            response_body = await response.read()
+            self.metrics.count(Metrics.BYTES_RECEIVED, len(response_body), stage=Metrics.CENSUS_COORDINATES)
+            response_result = json.loads(response_body).get('result')
             geographies = response_result.get('geographies')
             if geographies:  # there is a match
                 block_info, = geographies.get('2020 Census Blocks')
@@ -133,7 +204,8 @@ class Geocoder:
 
     def _compare_address(self, address_1: str, parsed_adress: List[Dict]) -> bool:
         """
-        Compare and answers if the two addresses is the same or not
+        Compare and answers if the two addresses is the same or not. See `verifier.verify_addresses` to compare
+        whole columns at once, e.g. to verify stored results again
         Args:
             address_1:
                 A string address
@@ -143,43 +215,7 @@ class Geocoder:
         Returns:
             If the two addresses is the same or not
         """
-        try:
-            tagged, _ = usaddress.tag(address_1)
-        except usaddress.RepeatedLabelError:
-            # With a legit address like `368 N 750 W, American Fork, UT 84003, USA`, usaddress confused
-            # 360 and 750 as address number. There has been multiple reports like this, not necessarily with
-            # address number alone (https://github.com/datamade/usaddress/issues?page=2&q=is%3Aissue+is%3Aopen+RepeatedLabelError)
-            return False
-
-        try:
-            # Get the dict values from Google response
-            address_number_dict = next(x for x in parsed_adress if x['types'] == ['street_number'])
-            street_name_dict = next(x for x in parsed_adress if x['types'] == ['route'])
-            city_name_dict = next(x for x in parsed_adress if 'locality' in x['types'])
-            state_name_dict = next(x for x in parsed_adress if 'administrative_area_level_1' in x['types'])
-            postal_code_dict = next(x for x in parsed_adress if x['types'] == ['postal_code'])
-        except StopIteration:
-            return False
-
-        # address number
-        if address_number_dict.get('long_name') != tagged.get('AddressNumber'):
-            return False
-        # street name
-        if street_name_dict.get('short_name').lower() != ' '.join(filter(None, [tagged.get('StreetName'),
-                                                                                tagged.get(
-                                                                                    'StreetNamePostType')])).lower():
-            return False
-        # city name
-        if city_name_dict.get('short_name').lower() != tagged.get('PlaceName').lower():
-            return False
-        # state name
-        if tagged.get('StateName').lower() != state_name_dict.get('short_name').lower():
-            return False
-        # postal code
-        if postal_code_dict['long_name'] != tagged.get('ZipCode'):
-            return False
-
-        return True
+        return verify_address(address_1, parsed_adress)
 
     async def process(self, addr: str, session: aiohttp.ClientSession) -> Tuple:
         """
@@ -191,12 +227,37 @@ class Geocoder:
         Returns:
             A tuple of (tract, block group, block, autocorrected_addr, if autocorrected_addr == addr)
         """
-        lng_lat_response = self._call_api_from_addr_to_lng_lat(addr)
-        lng, lat, autocorrected_addr, addr_components = self._parse_google_response(lng_lat_response)
+        if self.cache is not None:
+            cached = self.cache.get(ResultCache.GOOGLE, addr)
+            if cached is not None:
+                tract, block_group, block, autocorrected_addr, is_matched, _, _ = cached
+                return tract, block_group, block, autocorrected_addr, is_matched == 'Match'
+
+        lng_lat_response = await self.scheduler.run(constants.GOOGLE_UPSTREAM, self._geocode_in_executor,
+                                                    addr, retry_on=(googlemaps.exceptions.TransportError,
+                                                                    googlemaps.exceptions.Timeout),
+                                                    throttled=self._is_google_throttled)
+        with self.metrics.time(Metrics.GOOGLE_PARSE):
+            lng, lat, autocorrected_addr, addr_components = self._parse_google_response(lng_lat_response)
         if lng and lat:  # a result was found through Google
-            census_response = await self._call_api_from_lat_lng_to_block(lng, lat, session)
-            tract, block_group, block = await self._parse_census_lng_lat_response(census_response)
+            tract = None
+            if self.block_index is not None:
+                tract, block_group, block = self.block_index.lookup_one(lng, lat)
+            if tract is None:
+                census_response = await self.scheduler.run(constants.CENSUS_COORD_UPSTREAM,
+                                                           self._call_api_from_lat_lng_to_block, lng, lat, session,
+                                                           retry_on=(aiohttp.ClientConnectionError,))
+                with self.metrics.time(Metrics.CENSUS_COORDINATES_PARSE):
+                    tract, block_group, block = await self._parse_census_lng_lat_response(census_response)
             # check if the address returned is the same as the original address
-            return tract, block_group, block, autocorrected_addr, self._compare_address(addr, addr_components)
+            with self.metrics.time(Metrics.COMPARE):
+                same_addr = self._compare_address(addr, addr_components)
+            self.metrics.count(Metrics.RESULTS, stage=Metrics.GOOGLE_GEOCODE,
+                               result='Match' if same_addr else 'No_Match')
+            if self.cache is not None and tract is not None:
+                self.cache.put(ResultCache.GOOGLE, addr, tract, block_group, block, autocorrected_addr,
+                               'Match' if same_addr else 'No_Match')
+            return tract, block_group, block, autocorrected_addr, same_addr
         else:  #
+            self.metrics.count(Metrics.RESULTS, stage=Metrics.GOOGLE_GEOCODE, result='Not_Found')
             return None, None, None, None, None
@@ -0,0 +1,48 @@
+import contextlib
+from typing import AsyncIterator, Optional
+
+import aiohttp
+
+from src import constants
+
+
+def create_session(limit: int = constants.HTTP_MAX_CONNECTIONS,
+                   limit_per_host: int = constants.HTTP_MAX_CONNECTIONS_PER_HOST,
+                   keepalive: float = constants.HTTP_KEEPALIVE_SECONDS,
+                   dns_cache: Optional[float] = constants.HTTP_DNS_CACHE_SECONDS,
+                   total_timeout: Optional[float] = constants.HTTP_TOTAL_TIMEOUT_SECONDS,
+                   connect_timeout: Optional[float] = constants.HTTP_CONNECT_TIMEOUT_SECONDS,
+                   read_timeout: Optional[float] = constants.HTTP_READ_TIMEOUT_SECONDS,
+                   compressed: bool = constants.HTTP_ACCEPT_COMPRESSED) -> aiohttp.ClientSession:
+    """
+    Create the session every request to Census goes through, from both stages. Its connections are pooled per host
+    and kept alive between requests, so that TLS handshakes are paid once per connection instead of once per request,
+    host names are resolved once per `dns_cache` seconds, and a request on a stalled socket fails after `read_timeout`
+    seconds without data instead of hanging the run. It must be created, used and closed in the same event loop
+    Args:
+        limit: The maximum number of open connections
+        limit_per_host: The maximum number of open connections to the same host
+        keepalive: Seconds an idle connection is kept open for the next request
+        dns_cache: Seconds a resolved host name is reused, `None` to keep it for the whole run
+        total_timeout: Seconds a whole request may take, `None` for no limit
+        connect_timeout: Seconds to open a connection, not counting the wait for a free one in the pool
+        read_timeout: Seconds to wait for the next bytes of a response
+        compressed: Ask for gzip/deflate compressed responses, which are decompressed as they are read
+    """
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, keepalive_timeout=keepalive,
+                                     ttl_dns_cache=dns_cache, use_dns_cache=True)
+    timeout = aiohttp.ClientTimeout(total=total_timeout, sock_connect=connect_timeout, sock_read=read_timeout)
+    headers = None if compressed else {'Accept-Encoding': 'identity'}
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers, auto_decompress=compressed)
+
+
+@contextlib.asynccontextmanager
+async def session_scope(session: Optional[aiohttp.ClientSession] = None) -> AsyncIterator[aiohttp.ClientSession]:
+    """
+    Use session if given, which stays open for its owner, or a new session from `create_session` closed at the end
+    """
+    if session is not None:
+        yield session
+        return
+    async with create_session() as new_session:
+        yield new_session
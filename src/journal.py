@@ -0,0 +1,103 @@
+import logging
+import os
+import pickle
+import sqlite3
+from typing import Any, Iterator, List, Tuple
+
+from src import constants
+
+
+class Journal:
+    """
+    Records which row ranges of an input file finished each stage, together with their results, so that a restarted
+    run only processes the missing rows. Ranges are half-open `[start, stop)` row positions: in the input file for the
+    Census stage, in the Census unmatched rows for the Google stage.
+
+    The journal is stored next to the input file and is discarded if the input file has changed since it was written,
+    or if it was written with other options, since the rows the ranges refer to depend on them
+    """
+
+    CENSUS = "census"
+    GOOGLE = "google"
+
+    def __init__(self, input_path: str, options: str = ''):
+        """
+        Args:
+            input_path:
+                The input file
+            options:
+                The options deciding which rows of the input file the stages see, e.g. if rows with the same address
+                are sent once, or which rows are rejected before Census
+        """
+        self.path = self.path_for(input_path)
+        self.logger = logging.getLogger(__name__)
+        stat = os.stat(input_path)
+        fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}:{options}"
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (fingerprint TEXT NOT NULL)")
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS ranges (
+                                       stage TEXT NOT NULL,
+                                       start INTEGER NOT NULL,
+                                       stop INTEGER NOT NULL,
+                                       result BLOB NOT NULL)''')
+        self.connection.execute("CREATE INDEX IF NOT EXISTS ranges_stage_start ON ranges (stage, start)")
+        row = self.connection.execute("SELECT fingerprint FROM meta").fetchone()
+        if row is not None and row[0] != fingerprint:
+            self.logger.warning(f"{input_path} or the options of the run have changed since the last run, "
+                                "starting over")
+            self.connection.execute("DELETE FROM ranges")
+        self.connection.execute("DELETE FROM meta")
+        self.connection.execute("INSERT INTO meta VALUES (?)", (fingerprint,))
+        self.connection.commit()
+
+    @staticmethod
+    def path_for(input_path: str) -> str:
+        return input_path + constants.JOURNAL_SUFFIX
+
+    def record(self, stage: str, start: int, stop: int, result: Any) -> None:
+        """
+        Mark the rows `[start, stop)` as finished for `stage`
+        Args:
+            stage: `Journal.CENSUS` or `Journal.GOOGLE`
+            start: The first row of the range
+            stop: The row after the last row of the range
+            result: The result of the range, any picklable object, returned as is by `results`
+        """
+        self.connection.execute("INSERT INTO ranges VALUES (?, ?, ?, ?)",
+                                (stage, start, stop, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)))
+        self.connection.commit()
+
+    def results(self, stage: str) -> Iterator[Tuple[int, int, Any]]:
+        """
+        The finished ranges of `stage`, in the order they were recorded
+        Returns:
+            An iterator of (start, stop, result)
+        """
+        for start, stop, result in self.connection.execute("SELECT start, stop, result FROM ranges WHERE stage = ? "
+                                                           "ORDER BY rowid", (stage,)):
+            yield start, stop, pickle.loads(result)
+
+    def pending_ranges(self, stage: str, start: int, stop: int) -> List[Tuple[int, int]]:
+        """
+        The parts of `[start, stop)` that have not finished `stage` yet
+        Returns:
+            A sorted list of disjoint (start, stop) ranges
+        """
+        done = self.connection.execute("SELECT start, stop FROM ranges WHERE stage = ? AND start < ? AND stop > ? "
+                                       "ORDER BY start", (stage, stop, start)).fetchall()
+        pending = []
+        for done_start, done_stop in done:
+            if done_start > start:
+                pending.append((start, done_start))
+            start = max(start, done_stop)
+        if start < stop:
+            pending.append((start, stop))
+        return pending
+
+    def remove(self) -> None:
+        """
+        Delete the journal once the run has finished
+        """
+        self.connection.close()
+        os.remove(self.path)
@@ -0,0 +1,163 @@
+import bisect
+import contextlib
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, Tuple
+
+from src import constants
+
+
+class Metrics:
+    """
+    Latency histograms, in-flight counts and counters of every stage of a run, so that we can see which leg dominates
+    the wall time. The stages are timed around each request or step, so a stage retried by the `Scheduler` is
+    counted once per attempt. It is thread safe, since the Google requests run in a thread pool.
+    At the end of a run, `write` exports everything as a Prometheus text file or as a JSON summary
+    """
+
+    CENSUS_BATCH = "census_batch"
+    CENSUS_BATCH_PARSE = "census_batch_parse"
+    GOOGLE_GEOCODE = "google_geocode"
+    GOOGLE_PARSE = "google_parse"
+    CENSUS_COORDINATES = "census_coordinates"
+    CENSUS_COORDINATES_PARSE = "census_coordinates_parse"
+    COMPARE = "compare"
+    PREFILTER = "prefilter"
+
+    BYTES_SENT = "bytes_sent"
+    BYTES_RECEIVED = "bytes_received"
+    RETRIES = "retries"
+    RESULTS = "results"
+
+    def __init__(self, buckets: Tuple[float, ...] = constants.METRICS_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        # stage -> count of observations per bucket, with a last bucket for +Inf
+        self.histograms: Dict[str, list] = {}
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.max_in_flight: Dict[str, int] = defaultdict(int)
+        # (name, sorted labels) -> value
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Record that one request or step of `stage` took `seconds`
+        """
+        with self.lock:
+            histogram = self.histograms.setdefault(stage, [0] * (len(self.buckets) + 1))
+            histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.seconds[stage] += seconds
+
+    @contextlib.contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """
+        Time the enclosed block as one observation of `stage` and count it as in flight meanwhile. It works around
+        an `await` as well
+        """
+        with self.lock:
+            self.in_flight[stage] += 1
+            self.max_in_flight[stage] = max(self.max_in_flight[stage], self.in_flight[stage])
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+            with self.lock:
+                self.in_flight[stage] -= 1
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Add value to the counter `name` with the given labels, e.g. `count(Metrics.RESULTS, stage=..., result='Match')`
+        """
+        with self.lock:
+            self.counters[name, tuple(sorted(labels.items()))] += value
+
+    def merge(self, other: 'Metrics') -> None:
+        """
+        Add the observations and counters of other, e.g. the metrics of a worker process. The in-flight maximums
+        are added as well, since the workers run at the same time
+        """
+        with self.lock:
+            for stage, histogram in other.histograms.items():
+                merged = self.histograms.setdefault(stage, [0] * (len(self.buckets) + 1))
+                self.histograms[stage] = [a + b for a, b in zip(merged, histogram)]
+                self.seconds[stage] += other.seconds[stage]
+                self.max_in_flight[stage] += other.max_in_flight[stage]
+            for key, value in other.counters.items():
+                self.counters[key] += value
+
+    def __getstate__(self) -> dict:
+        # The lock cannot be pickled, which is needed to send metrics back from a worker process
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            A dict with, for each stage, the number of observations, their total and mean seconds, the share of the
+            time of all stages, the highest in-flight count and the histogram; and the value of each counter
+        """
+        with self.lock:
+            total_seconds = sum(self.seconds.values())
+            stages = {}
+            for stage, histogram in self.histograms.items():
+                requests = sum(histogram)
+                stages[stage] = {
+                    'count': requests,
+                    'seconds': self.seconds[stage],
+                    'mean_seconds': self.seconds[stage] / requests,
+                    'share_of_time': self.seconds[stage] / total_seconds if total_seconds else 0.0,
+                    'max_in_flight': self.max_in_flight[stage],
+                    'histogram': dict(zip([str(b) for b in self.buckets] + ['+Inf'], histogram)),
+                }
+            counters = defaultdict(list)
+            for (name, labels), value in self.counters.items():
+                counters[name].append({**dict(labels), 'value': value})
+        return {'stages': stages, 'counters': dict(counters)}
+
+    def to_prometheus(self) -> str:
+        """
+        Returns:
+            The metrics in the Prometheus text exposition format, for the node exporter textfile collector
+        """
+        prefix = constants.METRICS_PREFIX
+        lines = [f'# HELP {prefix}_stage_seconds Seconds taken by each request or step of a stage',
+                 f'# TYPE {prefix}_stage_seconds histogram']
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for le, count in zip([str(b) for b in self.buckets] + ['+Inf'], histogram):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {self.seconds[stage]}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+            lines += [f'# HELP {prefix}_stage_max_in_flight Highest number of requests or steps of a stage at once',
+                      f'# TYPE {prefix}_stage_max_in_flight gauge']
+            lines += [f'{prefix}_stage_max_in_flight{{stage="{stage}"}} {value}'
+                      for stage, value in sorted(self.max_in_flight.items())]
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines += [f'# TYPE {prefix}_{name}_total counter']
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        label_text = ','.join(f'{key}="{label}"' for key, label in labels)
+                        lines.append(f'{prefix}_{name}_total{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """
+        Write the metrics to path, as a JSON summary if it ends with `.json`, in the Prometheus text format otherwise
+        """
+        with open(path, 'w') as f:
+            if path.endswith('.json'):
+                json.dump(self.summary(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
@@ -0,0 +1,150 @@
+import functools
+import re
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_address(addr: str) -> str:
+    """
+    Normalize an address to use as a cache key. `5412 Youngstown Warren Rd., Niles, OH 44446` and
+    `5412 YOUNGSTOWN WARREN RD , NILES , OH , 44446` both become `5412 YOUNGSTOWN WARREN RD NILES OH 44446`
+    Args:
+        addr: An address
+    Returns:
+        The upper-cased address without punctuation and with single spaces
+    """
+    addr = _PUNCTUATION.sub(" ", str(addr).upper())
+    return _WHITESPACE.sub(" ", addr).strip()
+
+
+@functools.lru_cache(maxsize=constants.ADDRESS_MEMO_SIZE)
+def canonicalize(addr: str) -> str:
+    """
+    On top of `normalize_address`, use the components tagged by `usaddress` to write street types, directions and
+    states the same way and to drop the country and the ZIP+4 extension. For example,
+    `5412 Youngstown Warren Road, Niles, Ohio 44446-1234, USA` becomes `5412 YOUNGSTOWN WARREN RD NILES OH 44446`.
+    Every other component is kept as it is, so that two different addresses never get the same canonical form
+    Args:
+        addr: An address
+    Returns:
+        The canonical form of the address
+    """
+    # Imported here, so that loading the module for `normalize_address` does not load the tagger model
+    import usaddress
+    try:
+        tagged, _ = usaddress.tag(str(addr).upper())
+    except usaddress.RepeatedLabelError:
+        return normalize_address(addr)
+
+    components = []
+    for label, value in tagged.items():
+        if label == 'CountryName':
+            continue
+        value = normalize_address(value)
+        if label in ('StreetNamePreType', 'StreetNamePostType'):
+            value = constants.STREET_SUFFIXES.get(value, value)
+        elif label in ('StreetNamePreDirectional', 'StreetNamePostDirectional'):
+            value = constants.DIRECTIONS.get(value, value)
+        elif label == 'StateName':
+            value = constants.STATE_NAMES.get(value, value)
+        elif label == 'ZipCode':
+            value = value[:5]
+        components.append(value)
+    return ' '.join(filter(None, components))
+
+
+def find_duplicates(addresses: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Group addresses by their canonical form
+    Args:
+        addresses: Addresses
+    Returns:
+        A tuple of (the positions of the first address of each group, the group of each address). The address at
+        position i has the same canonical form as the address at position `first_positions[groups[i]]`
+    """
+    groups, _ = pd.factorize(addresses.map(canonicalize))
+    _, first_positions = np.unique(groups, return_index=True)
+    return first_positions, groups
+
+
+def row_id_key(row_id) -> str:
+    """
+    The key of a row ID that survives the round trip through Census: the IDs of the rows sent are parsed again as
+    numbers when they look like numbers, so that `001` comes back as `1` and `1.50` as `1.5`
+    Args:
+        row_id: A row ID, as read from the input or as parsed back from Census
+    Returns:
+        The ID without leading zeros or trailing decimal zeros if it is a number, the ID as a string otherwise
+    """
+    row_id = str(row_id)
+    try:
+        return str(int(row_id))
+    except ValueError:
+        pass
+    try:
+        number = float(row_id)
+    except ValueError:
+        return row_id
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+def deduplicate_csv(filename: str, unique_filename: str, chunksize: int = constants.MAX_LINES_ALLOWED_CENSUS) \
+        -> pd.DataFrame:
+    """
+    Copy the rows of filename with an address not seen before to unique_filename, a chunk at a time
+    Args:
+        filename:
+            The CSV file with the columns `Unique ID`, `Street address`, `City`, `State`, `ZIP` and no header
+        unique_filename:
+            Where to write the rows with unique addresses, in the same format
+        chunksize:
+            The rows read at a time
+    Returns:
+        A df with the columns `ID` and `representative_ID`, as strings, for every row left out because the same
+        address was already written for the row `representative_ID`, and `representative_key`, the `row_id_key` of
+        `representative_ID`
+    """
+    representative_by_address = {}
+    duplicates = []
+    open(unique_filename, 'w').close()
+    with pd.read_csv(filename, header=None, dtype=str, keep_default_na=False, chunksize=chunksize) as reader:
+        for chunk in reader:
+            addresses = chunk.iloc[:, 1:5].agg(', '.join, axis=1).map(canonicalize)
+            is_unique = np.zeros(len(chunk), dtype=bool)
+            for i, (row_id, address) in enumerate(zip(chunk.iloc[:, 0], addresses)):
+                representative = representative_by_address.setdefault(address, row_id)
+                if representative == row_id:
+                    is_unique[i] = True
+                else:
+                    duplicates.append((row_id, representative, row_id_key(representative)))
+            chunk[is_unique].to_csv(unique_filename, mode='a', header=False, index=False)
+    return pd.DataFrame(duplicates, columns=['ID', 'representative_ID', 'representative_key'])
+
+
+def fan_out(results: pd.DataFrame, duplicates: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Add a copy of the result of a representative row for each row left out by `deduplicate_csv` because it had
+    the same address
+    Args:
+        results:
+            A df of results with an `ID` column, with the IDs parsed in any way
+        duplicates:
+            The df returned by `deduplicate_csv`
+    Returns:
+        results followed by the copies, which have the ID of the row left out. Every ID is in its `row_id_key` form,
+        the one Census gives back, so that an ID is written the same way whether its row was left out or not
+    """
+    # The IDs of results were parsed again after the round trip through Census
+    results = results.assign(ID=results['ID'].map(row_id_key))
+    if duplicates is None or not len(duplicates) or not len(results):
+        return results
+    copies = duplicates.assign(ID=duplicates['ID'].map(row_id_key))[['ID', 'representative_key']].merge(
+        results.rename(columns={'ID': 'representative_key'}), on='representative_key')
+    return pd.concat([results, copies[results.columns]])
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+from typing import Iterable, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+
+
+def _zip_codes(zips) -> np.ndarray:
+    """
+    The 5-digit ZIP codes as integers, -1 for values that are not a ZIP code, e.g. `44060-1234` is 44060
+    """
+    zips = pd.Series(zips, dtype=str).str.strip().str[:5]
+    return pd.to_numeric(zips.where(zips.str.fullmatch(r'\d{5}')), errors='coerce').fillna(-1).to_numpy(np.int64)
+
+
+def _state_fips(states) -> np.ndarray:
+    """
+    The FIPS codes of states written as abbreviations or names, -1 for unknown states
+    """
+    states = pd.Series(states, dtype=str).str.strip().str.upper()
+    states = states.map(lambda state: constants.STATE_NAMES.get(state, state))
+    return states.map(constants.STATE_FIPS).fillna(-1).to_numpy(np.int64)
+
+
+class ZipIndex:
+    """
+    The tracts each ZIP code overlaps, from the 2020 ZCTA to tract relationship file of Census
+    (https://www2.census.gov/geo/docs/maps-data/data/rel2020/zcta520/tab20_zcta520_tract20_natl.txt). It is used to
+    reject addresses whose ZIP is not in their state before they are sent anywhere, e.g.
+    `9999999 MSON, CHICAGO, NY, 60601`, and to load only the blocks of those tracts for the offline lookup.
+    Tracts are stored as their 11-digit GEOID, 2 digits of state, 3 of county and 6 of tract, in sorted arrays.
+
+    ZIP codes without a ZCTA, like most PO boxes, are not in the index and their addresses are always kept
+    """
+
+    def __init__(self, zips: Sequence[int], tracts: Sequence[int]):
+        """
+        Args:
+            zips: ZIP codes, as integers
+            tracts: The GEOID of a tract overlapping the ZIP code at the same position, as integers
+        """
+        pairs = np.unique(np.column_stack([np.asarray(zips, dtype=np.int64), np.asarray(tracts, dtype=np.int64)]),
+                          axis=0).reshape(-1, 2)
+        # The tracts of the ZIP code at position i of `zips` are `tracts[offsets[i]:offsets[i + 1]]`
+        self.zips, starts = np.unique(pairs[:, 0], return_index=True)
+        self.offsets = np.append(starts, len(pairs))
+        self.tracts = pairs[:, 1]
+        # The states of each ZIP code, as `zip * 100 + state`
+        self.zip_states = np.unique(pairs[:, 0] * 100 + pairs[:, 1] // 10 ** 9)
+        logging.getLogger(__name__).info(f"Indexed the tracts of {len(self.zips)} ZIP codes")
+
+    @classmethod
+    def from_relationship_file(cls, path: str):
+        """
+        Load the ZCTA to tract relationship file, `|` separated with a header
+        """
+        df = pd.read_csv(path, sep='|', usecols=['GEOID_ZCTA5_20', 'GEOID_TRACT_20'], dtype=str,
+                         encoding='utf-8-sig').dropna()
+        return cls(df['GEOID_ZCTA5_20'].astype(np.int64), df['GEOID_TRACT_20'].astype(np.int64))
+
+    def consistent(self, states, zips) -> np.ndarray:
+        """
+        Check many addresses at once
+        Args:
+            states: The state of each address, as an abbreviation or a name
+            zips: The ZIP code of each address
+        Returns:
+            A boolean array, `False` for the addresses whose ZIP code is known to be in other states only
+        """
+        states, zips = _state_fips(states), _zip_codes(zips)
+        is_known = np.isin(zips, self.zips) & (states >= 0)
+        return ~is_known | np.isin(zips * 100 + states, self.zip_states)
+
+    def is_consistent(self, state: str, zip_code: str) -> bool:
+        return bool(self.consistent([state], [zip_code])[0])
+
+    def fingerprint(self) -> str:
+        """
+        Returns:
+            A digest of the ZIP codes and states indexed, which decide the rows `prefilter_csv` keeps
+        """
+        return hashlib.sha1(self.zips.tobytes() + self.zip_states.tobytes()).hexdigest()
+
+    def tracts_of(self, zips: Iterable) -> np.ndarray:
+        """
+        Returns:
+            The sorted GEOIDs of the tracts the ZIP codes overlap
+        """
+        is_candidate = np.isin(np.repeat(self.zips, np.diff(self.offsets)), _zip_codes(list(zips)))
+        return np.unique(self.tracts[is_candidate])
+
+
+def prefilter_csv(filename: str, kept_filename: str, zip_index: ZipIndex,
+                  chunksize: int = constants.MAX_LINES_ALLOWED_CENSUS) -> pd.DataFrame:
+    """
+    Copy the rows of filename whose ZIP code can be in their state to kept_filename, a chunk at a time
+    Args:
+        filename:
+            The CSV file with the columns `Unique ID`, `Street address`, `City`, `State`, `ZIP` and no header
+        kept_filename:
+            Where to write the rows kept, in the same format
+        zip_index:
+            The index the rows are checked against
+        chunksize:
+            The rows read at a time
+    Returns:
+        A df with the columns `ID` and `Street address`, as strings, of every row left out
+    """
+    rejected = []
+    open(kept_filename, 'w').close()
+    with pd.read_csv(filename, header=None, dtype=str, keep_default_na=False, chunksize=chunksize) as reader:
+        for chunk in reader:
+            is_kept = zip_index.consistent(chunk.iloc[:, 3], chunk.iloc[:, 4])
+            chunk[is_kept].to_csv(kept_filename, mode='a', header=False, index=False)
+            rejected.extend((row[0], ', '.join(row[1:5])) for row in chunk[~is_kept].itertuples(index=False))
+    return pd.DataFrame(rejected, columns=['ID', 'Street address'])
+
+
+def zip_codes_of(filename: str, chunksize: int = constants.MAX_LINES_ALLOWED_CENSUS) -> Set[str]:
+    """
+    The distinct ZIP codes of the addresses in filename, in the same format as for `prefilter_csv`
+    """
+    zips = set()
+    with pd.read_csv(filename, header=None, usecols=[4], dtype=str, keep_default_na=False,
+                     chunksize=chunksize) as reader:
+        for chunk in reader:
+            zips.update(chunk[4])
+    return zips
@@ -0,0 +1,157 @@
+import os
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+from src import constants
+
+# The pandas type of each column of the result files, as stored in Parquet. Tracts have 6 digits, blocks 4 and block
+# groups 1, states and counties are FIPS codes with their leading zeros
+RESULT_TYPES = {'ID': 'string', 'Street address': 'string', 'corrected_address': 'string', 'state': 'category',
+                'county': 'category', 'tract': 'Int32', 'block': 'Int16', 'blockgroup': 'Int8',
+                'autocorrected_addr': 'string', 'same_addr': 'boolean'}
+FIPS_DIGITS = {'state': 2, 'county': 3}
+FORMATS = ['csv', 'parquet']
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError("Reading and writing Parquet needs pyarrow, install it with `pip install pyarrow`") from exc
+    return pyarrow
+
+
+def is_parquet(path: str) -> bool:
+    return str(path).endswith('.parquet')
+
+
+def with_format(path: str, output_format: str) -> str:
+    """
+    Returns:
+        path with the extension of output_format, `csv` or `parquet`
+    """
+    return os.path.splitext(str(path))[0] + '.' + output_format
+
+
+def arrow_schema(columns: List[str]):
+    """
+    Returns:
+        The Arrow schema of a result file with these columns, in this order
+    """
+    pa = _import_pyarrow()
+    types = {'ID': pa.string(), 'Street address': pa.string(), 'corrected_address': pa.string(),
+             'state': pa.dictionary(pa.int8(), pa.string()), 'county': pa.dictionary(pa.int16(), pa.string()),
+             'tract': pa.int32(), 'block': pa.int16(), 'blockgroup': pa.int8(),
+             'autocorrected_addr': pa.string(), 'same_addr': pa.bool_()}
+    return pa.schema([(column, types[column]) for column in columns])
+
+
+def typed(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast the columns of a result df to `RESULT_TYPES`, whatever they were parsed as
+    """
+    df = df.copy()
+    for column in df.columns:
+        dtype = RESULT_TYPES[column]
+        if column in FIPS_DIGITS:
+            codes = pd.to_numeric(df[column], errors='coerce').astype('Int16').astype('string')
+            df[column] = codes.str.zfill(FIPS_DIGITS[column]).astype(dtype)
+        elif dtype.startswith('Int'):
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+        elif dtype == 'boolean':
+            df[column] = df[column].map({True: True, False: False, 'True': True, 'False': False}).astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+class ResultWriter:
+    """
+    Append dfs of results to a CSV or a Parquet file, depending on the extension of path, with the types in
+    `RESULT_TYPES`. In Parquet, every df is written as a row group, so that the file is streamed as it is written and is
+    read back a row group at a time with the same types. Parquet needs `pyarrow`
+    """
+
+    def __init__(self, path: str, columns: List[str]):
+        self.path = path
+        self.columns = list(columns)
+        self.parquet_writer = None
+        if is_parquet(path):
+            pa = _import_pyarrow()
+            self.schema = arrow_schema(self.columns)
+            self.parquet_writer = pa.parquet.ParquetWriter(path, self.schema)
+        else:
+            pd.DataFrame(columns=self.columns).to_csv(path, index=False)
+
+    def write(self, df: pd.DataFrame) -> None:
+        # Typed in CSV too, so that codes read back as floats from a chunk with nulls are written as integers, and
+        # every format writes the same values
+        df = typed(df.reindex(columns=self.columns))
+        if self.parquet_writer is None:
+            df.to_csv(self.path, mode='a', header=False, index=False)
+        elif len(df):
+            pa = _import_pyarrow()
+            self.parquet_writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self) -> None:
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+    def __enter__(self) -> 'ResultWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _arrow_to_pandas(table) -> pd.DataFrame:
+    pa = _import_pyarrow()
+    pandas_types = {pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(),
+                    pa.bool_(): pd.BooleanDtype(), pa.string(): pd.StringDtype()}
+    return table.to_pandas(types_mapper=pandas_types.get)
+
+
+def iter_results(path: str, chunksize: int = constants.MAX_LINES_ALLOWED_CENSUS) -> Iterator[pd.DataFrame]:
+    """
+    Read a result file written by `ResultWriter`, chunksize rows at a time
+    """
+    if is_parquet(path):
+        pa = _import_pyarrow()
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield _arrow_to_pandas(pa.Table.from_batches([batch]))
+    else:
+        with pd.read_csv(path, chunksize=chunksize) as reader:
+            yield from reader
+
+
+def read_results(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read a whole result file written by `ResultWriter`, or only some of its columns
+    """
+    if is_parquet(path):
+        pa = _import_pyarrow()
+        return _arrow_to_pandas(pa.parquet.read_table(path, columns=columns))
+    return pd.read_csv(path, usecols=columns)
+
+
+def result_columns(path: str) -> List[str]:
+    """
+    Returns:
+        The columns of a result file written by `ResultWriter`
+    """
+    if is_parquet(path):
+        return _import_pyarrow().parquet.read_schema(path).names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def merge_results(paths: List[str], merged_path: str) -> None:
+    """
+    Concatenate result files with the same columns into merged_path, a chunk at a time. The formats of the files
+    may differ
+    """
+    with ResultWriter(merged_path, result_columns(paths[0])) as writer:
+        for path in paths:
+            for chunk in iter_results(path):
+                writer.write(chunk)
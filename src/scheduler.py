@@ -0,0 +1,134 @@
+import asyncio
+import inspect
+import logging
+import random
+import time
+from typing import Callable, Dict, Optional, Tuple, Type
+
+from src import constants
+from src.metrics import Metrics
+
+
+class TokenBucket:
+    """
+    A token bucket that lets through at most `rate` requests per second, with bursts up to `capacity`.
+    When the upstream throttles us, the rate is halved, then it creeps back up to `max_rate` with every success,
+    so that we stay around the highest rate the upstream tolerates.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: float = constants.MIN_RATE_PER_SECOND):
+        self.max_rate = self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        """
+        Wait until a token is available and take it
+        """
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def throttle(self) -> None:
+        """
+        Halve the rate after the upstream told us to slow down
+        """
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self) -> None:
+        """
+        Increase the rate a little after a successful request
+        """
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+
+class Scheduler:
+    """
+    Run requests to several upstreams with a bound on the number of requests in flight, a token bucket per upstream,
+    and retries with jittered exponential backoff when the upstream answers 429/5xx or the connection fails. A 429, or
+    an exception the caller recognizes as throttling, also slows the token bucket of the upstream down.
+    The retries are counted in `self.metrics` by upstream and reason
+    """
+
+    def __init__(self, max_in_flight: int = constants.MAX_IN_FLIGHT_REQUESTS,
+                 rates: Dict[str, float] = constants.RATE_LIMITS_PER_SECOND,
+                 max_retries: int = constants.MAX_RETRIES,
+                 backoff_base: float = constants.BACKOFF_BASE_SECONDS,
+                 backoff_max: float = constants.BACKOFF_MAX_SECONDS,
+                 metrics: Optional[Metrics] = None):
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.buckets = {upstream: TokenBucket(rate) for upstream, rate in rates.items()}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self.metrics = metrics or Metrics()
+        self.logger = logging.getLogger(__name__)
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter", so that requests throttled at the same time do not come back at the same time
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def run(self, upstream: str, func: Callable, *args, retry_on: Tuple[Type[BaseException], ...] = (),
+                  throttled: Optional[Callable[[BaseException], bool]] = None):
+        """
+        Call `func(*args)` once a slot and a token for `upstream` are available
+        Args:
+            upstream:
+                The name of the upstream, one of the keys of `rates`
+            func:
+                A function or a coroutine function making the request. If it returns an object with a `status`
+                attribute (e.g. an `aiohttp.ClientResponse`), a status in `RETRY_STATUSES` triggers a retry
+            retry_on:
+                Exceptions that trigger a retry, on top of connection errors and timeouts
+            throttled:
+                Tells if an exception raised by `func` means that the upstream throttled us, like a 429 does. Such
+                exceptions trigger a retry, and halve the rate of the upstream
+        Returns:
+            What `func` returns on the last attempt
+        """
+        bucket = self.buckets[upstream]
+        retry_on = retry_on + (ConnectionError, asyncio.TimeoutError)
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            async with self.semaphore:
+                await bucket.acquire()
+                try:
+                    result = func(*args)
+                    if inspect.isawaitable(result):
+                        result = await result
+                except Exception as exc:
+                    is_throttled = throttled is not None and throttled(exc)
+                    if last_attempt or not (is_throttled or isinstance(exc, retry_on)):
+                        raise
+                    if is_throttled:
+                        bucket.throttle()
+                    self.logger.warning(f"Request to {upstream} failed ({exc!r}), retrying")
+                    reason = type(exc).__name__
+                else:
+                    status = getattr(result, 'status', None)
+                    if status not in constants.RETRY_STATUSES:
+                        bucket.recover()
+                        return result
+                    if last_attempt:
+                        return result
+                    if status == 429:
+                        bucket.throttle()
+                    self.logger.warning(f"{upstream} responded with {status}, retrying")
+                    reason = str(status)
+                    if hasattr(result, 'release'):
+                        result.release()
+            self.retries += 1
+            self.metrics.count(Metrics.RETRIES, upstream=upstream, reason=reason)
+            await asyncio.sleep(self._backoff(attempt))
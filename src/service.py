@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from aiohttp import web
+
+from src import constants
+from src.block_index import BlockIndex
+from src.cache import ResultCache
+from src.data_handler import DataHandler
+from src.geocoder import Geocoder
+from src.http_client import create_session
+from src.metrics import Metrics
+from src.normalizer import normalize_address
+from src.prefilter import ZipIndex
+from src.scheduler import Scheduler
+
+ADDRESS_FIELDS = ['street', 'city', 'state', 'zip']
+RESULT_FIELDS = ['address', 'source', 'state', 'county', 'tract', 'blockgroup', 'block', 'corrected_address',
+                 'same_addr']
+
+
+def _optional_int(value) -> Optional[int]:
+    return None if value is None or pd.isna(value) else int(value)
+
+
+def _optional_str(value) -> Optional[str]:
+    return value if isinstance(value, str) else None
+
+
+class GeocodingService:
+    """
+    Geocode addresses coming one or a few at a time, e.g. on the request path of another service, with the same two
+    stages as the file mode. The keys, the clients, the HTTP session and the memoized address tags are set up once and
+    stay warm between calls. Addresses arriving within `window` seconds of each other are sent to Census in one batch
+    of up to `max_batch_size` rows, and the ones Census cannot match go through `Geocoder.process`. An address asked
+    for again while it is being looked up is looked up once. With a `zip_index`, an address whose ZIP code is not in
+    its state is answered right away, without a result.
+
+    Use it as an async context manager, or call `start` and `close`
+    """
+
+    def __init__(self, cache: Optional[ResultCache] = None, block_index: Optional[BlockIndex] = None,
+                 max_in_flight: int = constants.MAX_IN_FLIGHT_REQUESTS,
+                 window: float = constants.SERVICE_BATCH_WINDOW_SECONDS,
+                 max_batch_size: int = constants.SERVICE_MAX_BATCH_SIZE, metrics: Optional[Metrics] = None,
+                 google_key: Optional[str] = None, census_key: Optional[str] = None,
+                 zip_index: Optional[ZipIndex] = None):
+        self.metrics = metrics or Metrics()
+        self.data_handler = DataHandler(cache, census_key=census_key, metrics=self.metrics)
+        self.geocoder = Geocoder(cache, Scheduler(max_in_flight, metrics=self.metrics), block_index=block_index,
+                                 google_key=google_key, census_key=self.data_handler.census_key, metrics=self.metrics)
+        self.zip_index = zip_index
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.session = None
+        self.batch_slots = None
+        # The addresses waiting for the next batch, with the future of their result
+        self.queue: List[Tuple[Tuple[str, ...], asyncio.Future]] = []
+        self.flush_handle = None
+        # normalized address -> future of its result, while it is being looked up
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.tasks = set()
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self) -> None:
+        self.session = create_session()
+        self.batch_slots = asyncio.Semaphore(constants.MAX_BATCHES_IN_FLIGHT)
+
+    async def close(self) -> None:
+        self._flush()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.session.close()
+        self.geocoder.close()
+
+    async def __aenter__(self) -> 'GeocodingService':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def geocode(self, street: str, city: str, state: str, zip_code: str) -> dict:
+        """
+        Geocode an address, waiting at most `window` seconds for other addresses to batch it with
+        Returns:
+            A dict with the `address`, the `source` of its result (`census`, `google` or `None` if nothing was found),
+            its `state`, `county`, `tract`, `blockgroup` and `block`, the `corrected_address` Census or Google
+            returned, and `same_addr`, if Google returned the same address
+        """
+        fields = tuple(str(field) for field in (street, city, state, zip_code))
+        if self.zip_index is not None and not self.zip_index.is_consistent(fields[2], fields[3]):
+            self.metrics.count(Metrics.RESULTS, stage=Metrics.PREFILTER, result='Rejected')
+            return {**dict.fromkeys(RESULT_FIELDS), 'address': ', '.join(fields)}
+        key = normalize_address(', '.join(fields))
+        future = self.in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.in_flight[key] = loop.create_future()
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+            self.queue.append((fields, future))
+            if len(self.queue) >= self.max_batch_size:
+                self._flush()
+            elif self.flush_handle is None:
+                self.flush_handle = loop.call_later(self.window, self._flush)
+        # Shielded, so that a caller giving up does not cancel the lookup shared with the other callers
+        return dict(await asyncio.shield(future))
+
+    def _flush(self) -> None:
+        """
+        Send the queued addresses to Census as one batch
+        """
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.queue = self.queue, []
+        if batch:
+            task = asyncio.create_task(self._process_batch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _process_batch(self, batch: List[Tuple[Tuple[str, ...], asyncio.Future]]) -> None:
+        chunk = pd.DataFrame([(i, *fields) for i, (fields, _) in enumerate(batch)])
+        try:
+            async with self.batch_slots:
+                census = await self.data_handler.process_batch(chunk, self.session)
+            rows = {int(row['ID']): row for row in census.to_dict('records')}
+        except Exception as exc:
+            # Google is tried on every address of the batch instead
+            self.logger.error(f"A batch of {len(batch)} addresses failed in Census: {exc!r}")
+            rows = {}
+        await asyncio.gather(*(self._resolve(fields, future, rows.get(i)) for i, (fields, future) in enumerate(batch)))
+
+    async def _resolve(self, fields: Tuple[str, ...], future: asyncio.Future, census_row: Optional[dict]) -> None:
+        """
+        Set the result of an address from its Census row, or from Google if Census did not match it
+        """
+        address = ', '.join(fields)
+        try:
+            if census_row is not None and census_row['is_matched'] == 'Match':
+                block = _optional_int(census_row['block'])
+                result = {'address': address, 'source': 'census', 'state': _optional_int(census_row['state']),
+                          'county': _optional_int(census_row['county']), 'tract': _optional_int(census_row['tract']),
+                          'blockgroup': None if block is None else block // 1000, 'block': block,
+                          'corrected_address': _optional_str(census_row['corrected_address']), 'same_addr': None}
+            else:
+                tract, block_group, block, corrected_address, same_addr = await self.geocoder.process(address,
+                                                                                                       self.session)
+                result = {'address': address, 'source': None if tract is None else 'google', 'state': None,
+                          'county': None, 'tract': _optional_int(tract), 'blockgroup': _optional_int(block_group),
+                          'block': _optional_int(block), 'corrected_address': _optional_str(corrected_address),
+                          'same_addr': same_addr}
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+
+def create_app(service: GeocodingService) -> web.Application:
+    """
+    Serve a `GeocodingService` over HTTP:
+        GET /geocode?street=...&city=...&state=...&zip=... geocodes an address
+        POST /geocode with a JSON object of the same fields, or a list of them, geocodes one or many addresses
+        GET /metrics returns the metrics of the service in the Prometheus text format
+    The service is started and closed with the application
+    """
+
+    async def geocode(request: web.Request) -> web.Response:
+        try:
+            body = dict(request.query) if request.method == 'GET' else await request.json()
+        except ValueError:
+            # `json.JSONDecodeError`, or a body that is not text at all
+            raise web.HTTPBadRequest(text="The body should be an address or a list of addresses, as JSON")
+        addresses = body if isinstance(body, list) else [body]
+        try:
+            results = await asyncio.gather(*(service.geocode(*(address[field] for field in ADDRESS_FIELDS))
+                                             for address in addresses))
+        except (KeyError, TypeError):
+            raise web.HTTPBadRequest(text=f"Every address needs the fields {', '.join(ADDRESS_FIELDS)}")
+        return web.json_response(results if isinstance(body, list) else results[0])
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=service.metrics.to_prometheus(), content_type='text/plain')
+
+    async def start(app: web.Application) -> None:
+        await service.start()
+
+    async def close(app: web.Application) -> None:
+        await service.close()
+
+    app = web.Application()
+    app.router.add_get('/geocode', geocode)
+    app.router.add_post('/geocode', geocode)
+    app.router.add_get('/metrics', metrics)
+    app.on_startup.append(start)
+    app.on_cleanup.append(close)
+    return app
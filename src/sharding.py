@@ -0,0 +1,79 @@
+import logging
+import os
+import re
+from typing import List
+
+import pandas as pd
+
+from src import constants
+
+# The words `normalizer.canonicalize` writes the same way, longest first so that `WEST VIRGINIA` is not `W VIRGINIA`
+_CANONICAL_WORDS = {**constants.STREET_SUFFIXES, **constants.DIRECTIONS, **constants.STATE_NAMES}
+_CANONICAL_WORD = re.compile(r'\b(' + '|'.join(sorted(_CANONICAL_WORDS, key=len, reverse=True)) + r')\b')
+
+
+def shard_keys(addresses: pd.Series) -> pd.Series:
+    """
+    `normalizer.canonicalize` without the tagger, on the whole column at once: street types, directions and state
+    names are written the same way wherever they are, and the country and the ZIP+4 extension are dropped. Addresses
+    with the same canonical form get the same key, and tagging, the slow part, is left to the workers
+    Args:
+        addresses: Addresses
+    Returns:
+        The key of each address
+    """
+    # `normalize_address`
+    keys = addresses.str.upper().str.replace(r'[^\w\s]', ' ', regex=True)
+    keys = keys.str.replace(r'\s+', ' ', regex=True).str.strip()
+    keys = keys.str.replace(_CANONICAL_WORD, lambda match: _CANONICAL_WORDS[match.group(0)], regex=True)
+    keys = keys.str.replace(r'\b(\d{5}) \d{4}\b', r'\1', regex=True)
+    return keys.str.replace(r' (USA|US|UNITED STATES( OF AMERICA)?)$', '', regex=True)
+
+
+def shard_paths(filename: str, shards: int) -> List[str]:
+    """
+    Returns:
+        The paths of the shards of filename, in `<filename>.shards/`
+    """
+    directory = filename + constants.SHARDS_SUFFIX
+    return [os.path.join(directory, f'shard_{i:03d}.csv') for i in range(shards)]
+
+
+def split_csv(filename: str, shards: int, chunksize: int = constants.MAX_LINES_ALLOWED_CENSUS) -> List[str]:
+    """
+    Split filename into shards by the hash of the `shard_keys` of the addresses, a chunk at a time. Rows with the same
+    canonical address end up in the same shard, so they are still sent once when each shard is deduplicated. The hash does not change
+    between runs, so the shards of an interrupted run are kept as they are and their journals stay valid, unless
+    filename changed since they were written
+    Args:
+        filename:
+            The CSV file with the columns `Unique ID`, `Street address`, `City`, `State`, `ZIP` and no header
+        shards:
+            The number of shards
+        chunksize:
+            The rows read at a time
+    Returns:
+        The paths of the shards, in the same format as filename
+    """
+    paths = shard_paths(filename, shards)
+    if all(os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(filename) for path in paths):
+        logging.info(f"Reusing the {shards} shards of {filename} from the previous run")
+        return paths
+
+    os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+    partial_paths = [path + '.partial' for path in paths]
+    for path in partial_paths:
+        open(path, 'w').close()
+    # An empty file has no column for `read_csv`, and all its shards are empty
+    if os.path.getsize(filename):
+        with pd.read_csv(filename, header=None, dtype=str, keep_default_na=False, chunksize=chunksize) as reader:
+            for chunk in reader:
+                keys = shard_keys(chunk[1] + ' ' + chunk[2] + ' ' + chunk[3] + ' ' + chunk[4])
+                shard_of_rows = pd.util.hash_pandas_object(keys, index=False).to_numpy() % shards
+                for shard, rows in chunk.groupby(shard_of_rows):
+                    rows.to_csv(partial_paths[shard], mode='a', header=False, index=False)
+    # Renamed at the end, so that a split interrupted halfway is not mistaken for a finished one
+    for partial_path, path in zip(partial_paths, paths):
+        os.replace(partial_path, path)
+    return paths
+
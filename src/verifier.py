@@ -0,0 +1,128 @@
+import functools
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import usaddress
+
+from src import constants
+
+FIELDS = ['number', 'street', 'city', 'state', 'zip']
+# Fields compared without case
+CASE_INSENSITIVE_FIELDS = ['street', 'city', 'state']
+
+
+@functools.lru_cache(maxsize=constants.ADDRESS_MEMO_SIZE)
+def tag_address(addr: str) -> Tuple[Optional[str], ...]:
+    """
+    Tag an address with `usaddress`, memoized since the same addresses come back again and again
+    Args:
+        addr: An address
+    Returns:
+        A tuple of (number, street, city, state, zip), with `None` for the missing fields or for every field
+        if the address cannot be tagged
+    """
+    try:
+        tagged, _ = usaddress.tag(addr)
+    except usaddress.RepeatedLabelError:
+        # With a legit address like `368 N 750 W, American Fork, UT 84003, USA`, usaddress confused
+        # 360 and 750 as address number. There has been multiple reports like this, not necessarily with
+        # address number alone (https://github.com/datamade/usaddress/issues?page=2&q=is%3Aissue+is%3Aopen+RepeatedLabelError)
+        return (None,) * len(FIELDS)
+    street = ' '.join(filter(None, [tagged.get('StreetName'), tagged.get('StreetNamePostType')])) or None
+    return (tagged.get('AddressNumber'), street, tagged.get('PlaceName'), tagged.get('StateName'),
+            tagged.get('ZipCode'))
+
+
+def google_fields(address_components: Optional[List[Dict]]) -> Tuple[Optional[str], ...]:
+    """
+    Pick the fields of `FIELDS` from the `address_components` of a Google result, in a single pass
+    Returns:
+        A tuple of (number, street, city, state, zip), with `None` for the missing fields
+    """
+    number = street = city = state = zip_code = None
+    for component in address_components or ():
+        types = component['types']
+        if types == ['street_number']:
+            number = number or component.get('long_name')
+        elif types == ['route']:
+            street = street or component.get('short_name')
+        elif 'locality' in types:
+            city = city or component.get('short_name')
+        elif 'administrative_area_level_1' in types:
+            state = state or component.get('short_name')
+        elif types == ['postal_code']:
+            zip_code = zip_code or component.get('long_name')
+    return number, street, city, state, zip_code
+
+
+def _field_matches(expected: pd.DataFrame, received: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compare two dfs of `FIELDS` column by column. A field matches if it is present on both sides and equal
+    """
+    for column in CASE_INSENSITIVE_FIELDS:
+        expected[column] = expected[column].str.lower()
+        received[column] = received[column].str.lower()
+    return (expected == received) & expected.notna() & received.notna()
+
+
+def score_addresses(addresses: Sequence[str], address_components: Sequence[Optional[List[Dict]]]) -> np.ndarray:
+    """
+    Compare addresses with the addresses Google returned for them
+    Args:
+        addresses: The original addresses
+        address_components: The `address_components` of the Google result of each address, or `None`
+    Returns:
+        The fraction of the number, street, city, state and ZIP of each address that are the same in the Google result
+    """
+    expected = pd.DataFrame([tag_address(addr) for addr in addresses], columns=FIELDS, dtype=object)
+    received = pd.DataFrame([google_fields(components) for components in address_components], columns=FIELDS,
+                            dtype=object)
+    return _field_matches(expected, received).mean(axis=1).to_numpy()
+
+
+def verify_address(addr: str, address_components: Optional[List[Dict]]) -> bool:
+    """
+    `verify_addresses` for a single address, without building dfs, to check each Google result as it comes back
+    Args:
+        addr: The original address
+        address_components: The `address_components` of its Google result, or `None`
+    Returns:
+        If the number, street, city, state and ZIP are all the same
+    """
+    for field, expected, received in zip(FIELDS, tag_address(addr), google_fields(address_components)):
+        if expected is None or received is None:
+            return False
+        if field in CASE_INSENSITIVE_FIELDS:
+            expected, received = expected.lower(), received.lower()
+        if expected != received:
+            return False
+    return True
+
+
+def verify_addresses(addresses: Sequence[str], address_components: Sequence[Optional[List[Dict]]]) -> np.ndarray:
+    """
+    Answer if addresses are the same as the addresses Google returned for them
+    Args:
+        addresses: The original addresses
+        address_components: The `address_components` of the Google result of each address, or `None`
+    Returns:
+        A boolean array, true where the number, street, city, state and ZIP are all the same
+    """
+    return score_addresses(addresses, address_components) == 1
+
+
+def reverify_results(addresses: Sequence[str], corrected_addresses: Sequence[Optional[str]]) -> np.ndarray:
+    """
+    Verify stored results without calling Google, by tagging the corrected address Google formatted instead of
+    using its components, e.g. the `Street address` and `autocorrected_addr` columns of a finished file
+    Args:
+        addresses: The original addresses
+        corrected_addresses: The `formatted_address` Google returned for each address, or `None`
+    Returns:
+        A boolean array, true where the number, street, city, state and ZIP are all the same
+    """
+    expected = pd.DataFrame([tag_address(addr) for addr in addresses], columns=FIELDS, dtype=object)
+    received = pd.DataFrame([tag_address(addr) if isinstance(addr, str) else (None,) * len(FIELDS)
+                             for addr in corrected_addresses], columns=FIELDS, dtype=object)
+    return _field_matches(expected, received).all(axis=1).to_numpy()
@@ -0,0 +1,33 @@
+import unittest
+
+from src.batch_tuner import BatchTuner
+
+
+class TestBatchTuner(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tuner = BatchTuner(batch_size=1500, max_in_flight=2, min_batch_size=100, max_batch_size=10000,
+                                max_in_flight_limit=4, target_seconds=60)
+
+    def test_fast_batches_grow(self):
+        self.tuner.record_success(1500, 15)
+        self.assertEqual(self.tuner.batch_size, 6000)
+        self.assertEqual(self.tuner.max_in_flight, 3)
+        for _ in range(10):
+            self.tuner.record_success(6000, 1)
+        self.assertEqual(self.tuner.batch_size, 10000)
+        self.assertEqual(self.tuner.max_in_flight, 4)
+
+    def test_slow_batches_shrink(self):
+        self.tuner.record_success(1500, 180)
+        self.assertEqual(self.tuner.batch_size, 500)
+        self.assertEqual(self.tuner.max_in_flight, 2)
+
+    def test_timeout(self):
+        self.tuner.record_timeout()
+        self.assertEqual(self.tuner.batch_size, 750)
+        self.assertEqual(self.tuner.max_in_flight, 1)
+        for _ in range(10):
+            self.tuner.record_timeout()
+        self.assertEqual(self.tuner.batch_size, 100)
+        self.assertEqual(self.tuner.max_in_flight, 1)
@@ -0,0 +1,49 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.block_index import BlockIndex
+
+HAS_PYSHP = importlib.util.find_spec('shapefile') is not None
+
+
+class TestBlockIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Two squares side by side, the second one with a square hole in the middle
+        left = [np.array([(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)])]
+        right = [np.array([(1, 0), (2, 0), (2, 1), (1, 1), (1, 0)]),
+                 np.array([(1.4, 0.4), (1.6, 0.4), (1.6, 0.6), (1.4, 0.6), (1.4, 0.4)])]
+        self.index = BlockIndex([left, right], states=[17, 17], counties=[31, 31], tracts=[320100, 320200],
+                                blocks=[1008, 2015], cell_size=0.25)
+
+    def test_lookup(self):
+        tracts, block_groups, blocks = self.index.lookup(np.array([0.5, 1.2, 1.5, 3.0]), np.array([0.5, 0.9, 0.5, 0.5]))
+        np.testing.assert_array_equal(tracts, [320100, 320200, -1, -1])
+        np.testing.assert_array_equal(block_groups, [1, 2, -1, -1])
+        np.testing.assert_array_equal(blocks, [1008, 2015, -1, -1])
+
+    def test_lookup_one(self):
+        self.assertEqual(self.index.lookup_one(0.1, 0.9), (320100, 1, 1008))
+        self.assertEqual(self.index.lookup_one(-87.628888, 41.88345), (None, None, None))
+
+    @unittest.skipUnless(HAS_PYSHP, 'Reading shapefiles needs pyshp')
+    def test_from_shapefiles_of_tracts(self):
+        import shapefile
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'tl_2020_17_tabblock20')
+            with shapefile.Writer(path, shapeType=shapefile.POLYGON) as writer:
+                for field in ['STATEFP20', 'COUNTYFP20', 'TRACTCE20', 'BLOCKCE20']:
+                    writer.field(field, 'C')
+                writer.poly([[(0, 0), (0, 1), (1, 1), (1, 0), (0, 0)]])
+                writer.record('17', '031', '320100', '1008')
+                writer.poly([[(1, 0), (1, 1), (2, 1), (2, 0), (1, 0)]])
+                writer.record('17', '031', '320200', '2015')
+
+            index = BlockIndex.from_shapefiles([path + '.shp'], cell_size=0.25, tracts=[17031320200])
+        np.testing.assert_array_equal(index.tracts, [320200])
+        self.assertEqual(index.lookup_one(1.5, 0.5), (320200, 2, 2015))
+        self.assertEqual(index.lookup_one(0.5, 0.5), (None, None, None))
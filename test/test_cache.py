@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from src.cache import ResultCache, normalize_address
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'cache.sqlite')
+        self.cache = ResultCache(self.path)
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_normalize_address(self):
+        self.assertEqual(normalize_address('5412 Youngstown Warren Rd., Niles, OH 44446'),
+                         normalize_address('5412 YOUNGSTOWN WARREN RD , NILES , OH , 44446'))
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get(ResultCache.CENSUS, '7701 MENTOR AVE , MENTOR , OH , 44060'))
+        self.cache.put(ResultCache.CENSUS, '7701 MENTOR AVE , MENTOR , OH , 44060', 206500, 2, 2055,
+                       '7701 MENTOR AVE, MENTOR, OH, 44060', 'Match', 39, 85)
+        self.assertEqual(self.cache.get(ResultCache.CENSUS, '7701 Mentor Ave, Mentor, OH, 44060'),
+                         (206500, 2, 2055, '7701 MENTOR AVE, MENTOR, OH, 44060', 'Match', 39, 85))
+        self.assertIsNone(self.cache.get(ResultCache.GOOGLE, '7701 MENTOR AVE , MENTOR , OH , 44060'))
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_invalidation(self):
+        self.cache.put(ResultCache.GOOGLE, '70 W MADISON, CHICAGO, IL, 60601', 3201, 1, 1008, None, 'Match')
+        other_vintage = ResultCache(self.path, vintage='another')
+        self.assertIsNone(other_vintage.get(ResultCache.GOOGLE, '70 W MADISON, CHICAGO, IL, 60601'))
+        self.assertEqual(other_vintage.purge(), 1)
+        other_vintage.close()
+
+        self.cache.put(ResultCache.GOOGLE, '70 W MADISON, CHICAGO, IL, 60601', 3201, 1, 1008, None, 'Match')
+        expired = ResultCache(self.path, ttl=-1)
+        self.assertIsNone(expired.get(ResultCache.GOOGLE, '70 W MADISON, CHICAGO, IL, 60601'))
+        expired.close()
+
+    def test_older_layout_is_emptied(self):
+        self.cache.close()
+        connection = sqlite3.connect(self.path)
+        connection.execute("DROP TABLE results")
+        connection.execute("CREATE TABLE results (stage TEXT, key TEXT, vintage TEXT, created_at REAL, tract INTEGER, "
+                           "block_group INTEGER, block INTEGER, corrected_address TEXT, is_matched TEXT)")
+        connection.execute("INSERT INTO results VALUES ('census', '70 W MADISON CHICAGO IL 60601', ?, ?, 3201, 1, "
+                           "1008, NULL, 'Match')", (self.cache.vintage, time.time()))
+        connection.execute("PRAGMA user_version = 0")
+        connection.commit()
+        connection.close()
+
+        self.cache = ResultCache(self.path)
+        self.assertIsNone(self.cache.get(ResultCache.CENSUS, '70 W MADISON, CHICAGO, IL, 60601'))
+        self.cache.put(ResultCache.CENSUS, '70 W MADISON, CHICAGO, IL, 60601', 3201, 1, 1008, None, 'Match', 17, 31)
+        self.assertEqual(self.cache.get(ResultCache.CENSUS, '70 W MADISON, CHICAGO, IL, 60601')[-2:], (17, 31))
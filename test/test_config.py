@@ -0,0 +1,23 @@
+import os
+import tempfile
+import unittest
+
+from src import config
+
+
+class TestConfig(unittest.TestCase):
+
+    def test_load_secret_once(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'secret.yaml')
+            with open(path, 'w') as f:
+                f.write("key:\n  census_api: census\n  google_api: google\n")
+            secret = config.load_secret(path)
+            os.remove(path)
+            # Read from the file the first time only
+            self.assertIs(config.load_secret(path), secret)
+        self.assertEqual(secret['key'], {'census_api': 'census', 'google_api': 'google'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,16 @@
+import asyncio
+import os
+import tempfile
 import unittest
+import unittest.mock
 
+import aiohttp
 import pandas as pd
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 
+from src.batch_tuner import BatchTuner
+from src.cache import ResultCache
 from src.data_handler import DataHandler
 
 
@@ -29,3 +38,161 @@ class TestDataHandler(unittest.TestCase):
         # act
         received_df = self.data_handler.append_to_table(address_df, tract_blkgrp_block)
         pd.testing.assert_frame_equal(expected_df, received_df)
+
+    def test_post_batch_to_census_cached(self):
+        # set up
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(os.path.join(tmp_dir, 'cache.sqlite'))
+            cache.put(ResultCache.CENSUS, '7701 MENTOR AVE, MENTOR, OH, 44060', 206500, 2, 2055,
+                      '7701 MENTOR AVE, MENTOR, OH, 44060', 'Match', 39, 85)
+            self.data_handler.cache = cache
+            chunk = pd.DataFrame([[1, '7701 MENTOR AVE', 'MENTOR', 'OH', 44060]])
+
+            # act, the session is never used since every address is cached
+            received_df = asyncio.run(self.data_handler._post_batch_to_census(chunk, session=None))
+            cache.close()
+
+        self.assertEqual(list(received_df.columns), DataHandler.PARSED_COLUMNS)
+        self.assertEqual(received_df.loc[0, 'is_matched'], 'Match')
+        self.assertEqual(received_df.loc[0, 'tract'], 206500)
+        self.assertEqual(received_df.loc[0, 'block'], 2055)
+
+    def test_cached_batch_same_as_uploaded(self):
+        # set up, a Census response for the addresses of the chunk
+        async def fake_upload(chunk, session):
+            body = ''.join(f'{row[0]},"{row[1]}, {row[2]}, {row[3]}, {row[4]}",Match,Exact,"{row[1]}, {row[2]}, '
+                           f'{row[3]}, {row[4]}","-81.3,41.6",1000,L,39,085,206500,2055\n' for row in chunk.values)
+            return DataHandler.parse_census_response(body.encode())
+
+        self.data_handler._upload_to_census = fake_upload
+        chunk = pd.DataFrame([[1, '7701 MENTOR AVE', 'MENTOR', 'OH', 44060], [2, '1 MAIN ST', 'MENTOR', 'OH', 44060]])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.data_handler.cache = ResultCache(os.path.join(tmp_dir, 'cache.sqlite'))
+
+            # act, the first call uploads the chunk and the second one reads it from the cache
+            uploaded_df = asyncio.run(self.data_handler._post_batch_to_census(chunk, session=None))
+            cached_df = asyncio.run(self.data_handler._post_batch_to_census(chunk, session=None))
+            self.data_handler.cache.close()
+
+        self.assertEqual(self.data_handler.cache.hits, 2)
+        pd.testing.assert_frame_equal(cached_df.reset_index(drop=True), uploaded_df.reset_index(drop=True))
+        self.assertEqual(list(cached_df['county']), [85, 85])
+
+    def test_iter_batches_bounded(self):
+        # set up
+        in_flight, max_in_flight = 0, 0
+
+        async def fake_upload(chunk, session):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return pd.DataFrame([[row[0], row[1], 'Match', 'Exact', row[1], None, None, None, 39, 155, 932701, 1003]
+                                 for row in chunk.values], columns=DataHandler.CENSUS_COLUMNS)
+
+        self.data_handler._upload_to_census = fake_upload
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'addresses.csv')
+            pd.DataFrame([[i, f'{i} MENTOR AVE', 'MENTOR', 'OH', 44060] for i in range(7)]).to_csv(
+                filename, index=False, header=False)
+
+            # act
+            async def collect():
+                return [df async for df in self.data_handler.iter_batches(filename, None, max_in_flight=2)]
+
+            self.data_handler.tuner = BatchTuner(batch_size=2, min_batch_size=2, max_batch_size=2)
+            received_dfs = asyncio.run(collect())
+
+        self.assertEqual(len(received_dfs), 4)
+        self.assertEqual(max_in_flight, 2)
+        self.assertEqual(sorted(pd.concat(received_dfs)['ID']), list(range(7)))
+
+    def test_iter_batches_split_on_timeout(self):
+        # set up
+        submitted_sizes = []
+
+        async def fake_upload(chunk, session):
+            submitted_sizes.append(len(chunk))
+            await asyncio.sleep(1 if len(chunk) > 2 else 0)
+            return pd.DataFrame([[row[0], row[1], 'Match', 'Exact', row[1], None, None, None, 39, 155, 932701, 1003]
+                                 for row in chunk.values], columns=DataHandler.CENSUS_COLUMNS)
+
+        self.data_handler._upload_to_census = fake_upload
+        self.data_handler.tuner = BatchTuner(batch_size=8, min_batch_size=1)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'addresses.csv')
+            pd.DataFrame([[i, f'{i} MENTOR AVE', 'MENTOR', 'OH', 44060] for i in range(8)]).to_csv(
+                filename, index=False, header=False)
+
+            # act
+            async def collect():
+                return [df async for df in self.data_handler.iter_batches(filename, None)]
+
+            with unittest.mock.patch('src.constants.CENSUS_BATCH_TIMEOUT_SECONDS', 0.1):
+                received_dfs = asyncio.run(collect())
+
+        self.assertEqual(submitted_sizes, [8, 4, 4, 2, 2, 2, 2])
+        self.assertEqual(sorted(pd.concat(received_dfs)['ID']), list(range(8)))
+
+    def test_upload_to_census_in_memory(self):
+        # set up, a local server answering like the Census batch endpoint
+        received = {}
+
+        async def address_batch(request):
+            form = await request.post()
+            received['fields'] = {k: v for k, v in form.items() if k != 'addressFile'}
+            received['file'] = form['addressFile'].file.read().decode()
+            return web.Response(text='1,"7701 MENTOR AVE, MENTOR, OH, 44060",Match,Exact,"7701 MENTOR AVE, MENTOR, OH, '
+                                     '44060","-81.3,41.6",1,L,39,085,206500,2055\n')
+
+        app = web.Application()
+        app.router.add_post('/addressbatch', address_batch)
+        chunk = pd.DataFrame([[1, '7701 MENTOR AVE', 'MENTOR', 'OH', 44060]])
+
+        # act
+        async def upload():
+            async with TestServer(app) as server, aiohttp.ClientSession() as session:
+                with unittest.mock.patch('src.constants.CENSUS_BATCH_URL', str(server.make_url('/addressbatch'))):
+                    return await self.data_handler._upload_to_census(chunk, session)
+
+        received_df = asyncio.run(upload())
+
+        self.assertEqual(received['file'], '1,7701 MENTOR AVE,MENTOR,OH,44060\n')
+        self.assertEqual(received['fields']['layers'], '10,12')
+        self.assertEqual(list(received_df.columns), DataHandler.PARSED_COLUMNS)
+        self.assertEqual(received_df.loc[0, 'tract'], 206500)
+        self.assertEqual(received_df.loc[0, 'block'], 2055)
+
+    def test_parse_and_partition_census_response(self):
+        # set up, rows that Census did not match have fewer columns
+        response_body = (b'1,"7701 MENTOR AVE, MENTOR, OH, 44060",Match,Exact,"7701 MENTOR AVE, MENTOR, OH, 44060",'
+                         b'"-81.3,41.6",1,L,39,085,206500,2055\n'
+                         b'2,"9999999 MSON, CHICAGO, NY, 60601",No_Match\n'
+                         b'3,"1 MAIN ST, NILES, OH, 44446",Tie\n'
+                         b'4,"70 W MADISON ST, CHICAGO, IL, 60602",Match,Non_Exact,"70 W MADISON ST, CHICAGO, IL, '
+                         b'60602","-87.6,41.9",2,R,17,031,320100,1008\n')
+
+        # act
+        census_df = DataHandler.parse_census_response(response_body)
+        matched, unmatched_and_tie = DataHandler.partition(self.data_handler._shape_census_result(census_df))
+
+        self.assertEqual(list(census_df.columns), DataHandler.PARSED_COLUMNS)
+        self.assertEqual({column: str(census_df[column].dtype) for column in ['state', 'county', 'tract', 'block']},
+                         {'state': 'Int8', 'county': 'Int16', 'tract': 'Int32', 'block': 'Int16'})
+        self.assertEqual(list(matched['ID']), [1, 4])
+        self.assertEqual(list(matched['county']), [85, 31])
+        self.assertEqual(list(unmatched_and_tie['ID']), [2, 3])
+        self.assertTrue(unmatched_and_tie['tract'].isna().all())
+        self.assertNotIn('is_matched', matched.columns)
+
+    def test_parse_census_response_without_match(self):
+        # Census sends only 3 fields for unmatched and tie rows, a batch may have no other row
+        response_body = b'2,"9999999 MSON, CHICAGO, NY, 60601",No_Match\n3,"1 MAIN ST, NILES, OH, 44446",Tie\n'
+
+        census_df = DataHandler.parse_census_response(response_body)
+
+        self.assertEqual(list(census_df.columns), DataHandler.PARSED_COLUMNS)
+        self.assertEqual(list(census_df['is_matched']), ['No_Match', 'Tie'])
+        self.assertEqual(str(census_df['tract'].dtype), 'Int32')
+        self.assertTrue(census_df['tract'].isna().all())
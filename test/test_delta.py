@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+import unittest
+
+import pandas as pd
+
+from src.delta import split_delta
+from src.result_files import ResultWriter, read_results
+
+COLUMNS = ['ID', 'Street address', 'corrected_address', 'state', 'county', 'tract', 'block', 'blockgroup',
+           'autocorrected_addr', 'same_addr']
+
+
+class TestDelta(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous = os.path.join(self.directory.name, 'addresses_1.csv')
+        self.previous_finished = os.path.join(self.directory.name, 'addresses_1_finished.csv')
+        self.filename = os.path.join(self.directory.name, 'addresses_2.csv')
+        pd.DataFrame([[1, '7701 MENTOR AVE', 'MENTOR', 'OH', '44060'],
+                      [2, '70 W MADISON ST', 'CHICAGO', 'IL', '60602'],
+                      [3, '5412 YOUNGSTOWN WARREN RD', 'NILES', 'OH', '44446'],
+                      [4, '1 MAIN ST', 'NILES', 'OH', '44446']]).to_csv(self.previous, header=False, index=False)
+        with ResultWriter(self.previous_finished, COLUMNS) as writer:
+            # Row 4 failed in the previous run and has no result
+            writer.write(pd.DataFrame({'ID': [1, 2, 3],
+                                       'Street address': ['7701 MENTOR AVE, MENTOR, OH, 44060',
+                                                          '70 W MADISON ST, CHICAGO, IL, 60602',
+                                                          '5412 YOUNGSTOWN WARREN RD, NILES, OH, 44446'],
+                                       'tract': [206500, 3201, 932701]}))
+        # Row 2 moved, row 3 was removed, row 5 was added
+        pd.DataFrame([[1, '7701 MENTOR AVE', 'MENTOR', 'OH', '44060'],
+                      [2, '71 W MADISON ST', 'CHICAGO', 'IL', '60602'],
+                      [4, '1 MAIN ST', 'NILES', 'OH', '44446'],
+                      [5, '9 ELM ST', 'NILES', 'OH', '44446']]).to_csv(self.filename, header=False, index=False)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_split_delta(self):
+        changed_path, carried_path = split_delta(self.filename, self.previous, self.previous_finished, chunksize=2)
+
+        changed = pd.read_csv(changed_path, header=None)
+        self.assertEqual(list(changed[0]), [2, 4, 5])
+        self.assertEqual(changed.loc[0, 1], '71 W MADISON ST')
+        carried = read_results(carried_path)
+        self.assertEqual(list(carried.columns), COLUMNS)
+        self.assertEqual(list(carried['ID']), [1])
+        self.assertEqual(list(carried['tract']), [206500])
+
+    def test_split_delta_zero_padded_ids(self):
+        # The finished file has the IDs parsed back from Census, `001` is `1`
+        with open(self.previous, 'w') as f:
+            f.write('001,7701 MENTOR AVE,MENTOR,OH,44060\n002,70 W MADISON ST,CHICAGO,IL,60602\n')
+        with open(self.filename, 'w') as f:
+            f.write('001,7701 MENTOR AVE,MENTOR,OH,44060\n002,71 W MADISON ST,CHICAGO,IL,60602\n')
+
+        changed_path, carried_path = split_delta(self.filename, self.previous, self.previous_finished)
+
+        self.assertEqual(list(pd.read_csv(changed_path, header=None, dtype=str)[0]), ['002'])
+        self.assertEqual(list(read_results(carried_path)['ID']), [1])
+
+    def test_split_delta_is_reused(self):
+        changed_path, _ = split_delta(self.filename, self.previous, self.previous_finished)
+        mtime = os.path.getmtime(changed_path)
+        self.assertEqual(split_delta(self.filename, self.previous, self.previous_finished)[0], changed_path)
+        self.assertEqual(os.path.getmtime(changed_path), mtime)
+
+        # A newer input is split again
+        time.sleep(0.01)
+        os.utime(self.filename)
+        split_delta(self.filename, self.previous, self.previous_finished)
+        self.assertGreater(os.path.getmtime(changed_path), mtime)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 from unittest import IsolatedAsyncioTestCase
 
 import aiohttp
+import googlemaps.exceptions
 
 from src import geocoder
 
@@ -50,6 +51,12 @@ class TestGeocoder(IsolatedAsyncioTestCase):
             self.assertTrue(type(result[1]) == int)
             self.assertTrue(type(result[2]) == int)
 
+    def test__is_google_throttled(self):
+        self.assertTrue(self.gc._is_google_throttled(googlemaps.exceptions.HTTPError(429)))
+        self.assertTrue(self.gc._is_google_throttled(googlemaps.exceptions.ApiError('OVER_QUERY_LIMIT')))
+        self.assertFalse(self.gc._is_google_throttled(googlemaps.exceptions.HTTPError(500)))
+        self.assertFalse(self.gc._is_google_throttled(googlemaps.exceptions.ApiError('REQUEST_DENIED')))
+
     def test__compare_address_all_correct(self):
         self.assertTrue(self.gc._compare_address(self.correct_street, self.correct_address_dict))
 
@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.http_client import create_session, session_scope
+
+
+class TestHttpClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.peers = set()
+
+        async def ok(request):
+            self.peers.add(request.transport.get_extra_info('peername'))
+            await asyncio.sleep(0.01)
+            return web.Response(text='ok')
+
+        async def stalled(request):
+            await asyncio.sleep(10)
+            return web.Response(text='too late')
+
+        app = web.Application()
+        app.router.add_get('/ok', ok)
+        app.router.add_get('/stalled', stalled)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.close()
+
+    async def test_connections_are_pooled(self):
+        async with create_session(limit_per_host=2) as session:
+            async def get():
+                async with session.get(self.server.make_url('/ok')) as response:
+                    return await response.text()
+
+            self.assertEqual(await asyncio.gather(*(get() for _ in range(10))), ['ok'] * 10)
+            self.assertEqual(await get(), 'ok')
+        # Every request went through one of the two connections of the pool
+        self.assertEqual(len(self.peers), 2)
+
+    async def test_read_timeout(self):
+        async with create_session(read_timeout=0.1) as session:
+            with self.assertRaises(asyncio.TimeoutError):
+                await session.get(self.server.make_url('/stalled'))
+
+    async def test_session_scope(self):
+        async with create_session() as session:
+            async with session_scope(session) as scoped:
+                self.assertIs(scoped, session)
+            self.assertFalse(session.closed)
+        async with session_scope() as scoped:
+            pass
+        self.assertTrue(scoped.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
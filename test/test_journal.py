@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.journal import Journal
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmp_dir.name, 'addresses.csv')
+        with open(self.input_path, 'w') as f:
+            f.write('1,7701 MENTOR AVE,MENTOR,OH,44060\n')
+        self.journal = Journal(self.input_path)
+
+    def tearDown(self) -> None:
+        self.journal.connection.close()
+        self.tmp_dir.cleanup()
+
+    def test_pending_ranges(self):
+        self.assertEqual(self.journal.pending_ranges(Journal.CENSUS, 0, 100), [(0, 100)])
+        self.journal.record(Journal.CENSUS, 10, 20, None)
+        self.journal.record(Journal.CENSUS, 30, 40, None)
+        self.assertEqual(self.journal.pending_ranges(Journal.CENSUS, 0, 100), [(0, 10), (20, 30), (40, 100)])
+        self.assertEqual(self.journal.pending_ranges(Journal.CENSUS, 15, 35), [(20, 30)])
+        self.assertEqual(self.journal.pending_ranges(Journal.CENSUS, 10, 20), [])
+        self.assertEqual(self.journal.pending_ranges(Journal.GOOGLE, 0, 100), [(0, 100)])
+
+    def test_results(self):
+        result = pd.DataFrame({'ID': [1], 'tract': pd.array([206500], dtype='Int64')})
+        self.journal.record(Journal.CENSUS, 0, 1, result)
+        (start, stop, received), = self.journal.results(Journal.CENSUS)
+        self.assertEqual((start, stop), (0, 1))
+        pd.testing.assert_frame_equal(result, received)
+
+    def test_reset_when_input_changes(self):
+        self.journal.record(Journal.CENSUS, 0, 1, None)
+        self.journal.connection.close()
+        with open(self.input_path, 'a') as f:
+            f.write('2,1901 NW EXPRESSWAY,OKLAHOMA CITY,OK,73118\n')
+        self.journal = Journal(self.input_path)
+        self.assertEqual(self.journal.pending_ranges(Journal.CENSUS, 0, 2), [(0, 2)])
+
+    def test_reset_when_options_change(self):
+        self.journal.record(Journal.CENSUS, 0, 1, None)
+        self.journal.connection.close()
+        self.journal = Journal(self.input_path, 'dedupe=False')
+        self.assertEqual(self.journal.pending_ranges(Journal.CENSUS, 0, 1), [(0, 1)])
+
+        self.journal.record(Journal.CENSUS, 0, 1, None)
+        self.journal.connection.close()
+        self.journal = Journal(self.input_path, 'dedupe=False')
+        self.assertEqual(self.journal.pending_ranges(Journal.CENSUS, 0, 1), [])
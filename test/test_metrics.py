@@ -0,0 +1,78 @@
+import json
+import os
+import pickle
+import tempfile
+import unittest
+
+from src.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.metrics = Metrics(buckets=(0.1, 1))
+
+    def test_histogram(self):
+        for seconds in (0.05, 0.5, 0.7, 5):
+            self.metrics.observe(Metrics.CENSUS_BATCH, seconds)
+        self.metrics.observe(Metrics.COMPARE, 0.25)
+        stage = self.metrics.summary()['stages'][Metrics.CENSUS_BATCH]
+        self.assertEqual(stage['count'], 4)
+        self.assertAlmostEqual(stage['seconds'], 6.25)
+        self.assertAlmostEqual(stage['share_of_time'], 6.25 / 6.5)
+        self.assertEqual(stage['histogram'], {'0.1': 1, '1': 2, '+Inf': 1})
+
+    def test_in_flight(self):
+        with self.metrics.time(Metrics.GOOGLE_GEOCODE):
+            with self.metrics.time(Metrics.GOOGLE_GEOCODE):
+                pass
+        with self.metrics.time(Metrics.GOOGLE_GEOCODE):
+            pass
+        stage = self.metrics.summary()['stages'][Metrics.GOOGLE_GEOCODE]
+        self.assertEqual(stage['count'], 3)
+        self.assertEqual(stage['max_in_flight'], 2)
+        self.assertEqual(self.metrics.in_flight[Metrics.GOOGLE_GEOCODE], 0)
+
+    def test_counters(self):
+        self.metrics.count(Metrics.RESULTS, 3, stage=Metrics.CENSUS_BATCH, result='Match')
+        self.metrics.count(Metrics.RESULTS, stage=Metrics.CENSUS_BATCH, result='Match')
+        self.metrics.count(Metrics.RESULTS, stage=Metrics.CENSUS_BATCH, result='Tie')
+        results = self.metrics.summary()['counters'][Metrics.RESULTS]
+        self.assertCountEqual(results, [{'stage': Metrics.CENSUS_BATCH, 'result': 'Match', 'value': 4},
+                                        {'stage': Metrics.CENSUS_BATCH, 'result': 'Tie', 'value': 1}])
+
+    def test_prometheus(self):
+        self.metrics.observe(Metrics.CENSUS_BATCH, 0.5)
+        self.metrics.observe(Metrics.CENSUS_BATCH, 2)
+        self.metrics.count(Metrics.RETRIES, upstream='google', reason='429')
+        text = self.metrics.to_prometheus()
+        self.assertIn('zipcodes_stage_seconds_bucket{stage="census_batch",le="1"} 1', text)
+        self.assertIn('zipcodes_stage_seconds_bucket{stage="census_batch",le="+Inf"} 2', text)
+        self.assertIn('zipcodes_stage_seconds_count{stage="census_batch"} 2', text)
+        self.assertIn('zipcodes_retries_total{reason="429",upstream="google"} 1', text)
+
+    def test_merge(self):
+        self.metrics.observe(Metrics.COMPARE, 0.5)
+        self.metrics.count(Metrics.RETRIES, upstream='google', reason='500')
+        worker = pickle.loads(pickle.dumps(self.metrics))
+        worker.observe(Metrics.COMPARE, 2)
+        self.metrics.merge(worker)
+        stage = self.metrics.summary()['stages'][Metrics.COMPARE]
+        self.assertEqual(stage['histogram'], {'0.1': 0, '1': 2, '+Inf': 1})
+        self.assertEqual(self.metrics.summary()['counters'][Metrics.RETRIES][0]['value'], 2)
+
+    def test_write(self):
+        self.metrics.observe(Metrics.COMPARE, 0.01)
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = os.path.join(directory, 'metrics.json')
+            self.metrics.write(json_path)
+            with open(json_path) as f:
+                self.assertEqual(json.load(f)['stages'][Metrics.COMPARE]['count'], 1)
+            prom_path = os.path.join(directory, 'metrics.prom')
+            self.metrics.write(prom_path)
+            with open(prom_path) as f:
+                self.assertIn('# TYPE zipcodes_stage_seconds histogram', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
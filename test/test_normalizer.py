@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.normalizer import canonicalize, deduplicate_csv, fan_out, find_duplicates, row_id_key
+
+
+class TestNormalizer(unittest.TestCase):
+
+    def test_canonicalize(self):
+        self.assertEqual(canonicalize('5412 YOUNGSTOWN WARREN RD , NILES , OH , 44446'),
+                         '5412 YOUNGSTOWN WARREN RD NILES OH 44446')
+        self.assertEqual(canonicalize('5412 Youngstown Warren Road, Niles, Ohio 44446-1234, USA'),
+                         '5412 YOUNGSTOWN WARREN RD NILES OH 44446')
+        self.assertNotEqual(canonicalize('5412 YOUNGSTOWN WARREN RD , NILES , OH , 44446'),
+                            canonicalize('5414 YOUNGSTOWN WARREN RD , NILES , OH , 44446'))
+
+    def test_find_duplicates(self):
+        addresses = pd.Series(['7701 MENTOR AVE , MENTOR , OH , 44060',
+                               '1901 NW EXPRESSWAY , OKLAHOMA CITY , OK , 73118',
+                               '7701 Mentor Avenue, Mentor, OH 44060'])
+        first_positions, groups = find_duplicates(addresses)
+        np.testing.assert_array_equal(first_positions, [0, 1])
+        np.testing.assert_array_equal(groups, [0, 1, 0])
+
+    def test_deduplicate_csv(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'addresses.csv')
+            unique_filename = os.path.join(tmp_dir, 'addresses.unique.csv')
+            pd.DataFrame([[1, '7701 MENTOR AVE', 'MENTOR', 'OH', '44060'],
+                          [2, '1901 NW EXPRESSWAY', 'OKLAHOMA CITY', 'OK', '73118'],
+                          [3, '7701 Mentor Ave.', 'Mentor', 'OH', '44060'],
+                          [4, '71 ST. NICHOLAS DRIVE', 'NORTH POLE', 'AK', '99705']]).to_csv(
+                filename, index=False, header=False)
+
+            duplicates = deduplicate_csv(filename, unique_filename, chunksize=2)
+
+            self.assertEqual(list(pd.read_csv(unique_filename, header=None)[0]), [1, 2, 4])
+        pd.testing.assert_frame_equal(duplicates, pd.DataFrame({'ID': ['3'], 'representative_ID': ['1'],
+                                                                'representative_key': ['1']}))
+
+    def test_row_id_key(self):
+        self.assertEqual([row_id_key(row_id) for row_id in ['001', 1, '1.0', 1.0, '1.50', 1.5, 'A01']],
+                         ['1', '1', '1', '1', '1.5', '1.5', 'A01'])
+        # Long numeric IDs are not rounded
+        self.assertNotEqual(row_id_key('12345678901234567'), row_id_key('12345678901234568'))
+
+    def test_fan_out_zero_padded_ids(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'addresses.csv')
+            unique_filename = os.path.join(tmp_dir, 'addresses.unique.csv')
+            with open(filename, 'w') as f:
+                f.write('001,7701 MENTOR AVE,MENTOR,OH,44060\n'
+                        '002,1901 NW EXPRESSWAY,OKLAHOMA CITY,OK,73118\n'
+                        '003,7701 Mentor Ave.,Mentor,OH,44060\n')
+
+            duplicates = deduplicate_csv(filename, unique_filename)
+            # Census returns the IDs of the unique rows, parsed again as numbers
+            results = pd.read_csv(unique_filename, header=None, usecols=[0, 1], names=['ID', 'Street address'])
+
+        finished = fan_out(results, duplicates)
+        self.assertEqual(list(finished['ID']), ['1', '2', '3'])
+        self.assertEqual(finished['Street address'].iloc[2], '7701 MENTOR AVE')
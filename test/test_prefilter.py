@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.prefilter import ZipIndex, prefilter_csv, zip_codes_of
+
+
+class TestZipIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # 60601 is in Chicago, 44060 in Mentor, 42223 straddles Kentucky and Tennessee
+        self.index = ZipIndex([60601, 60601, 44060, 42223, 42223],
+                              [17031081403, 17031081500, 39085206500, 21047200100, 47125101800])
+
+    def test_consistent(self):
+        consistent = self.index.consistent(['NY', 'IL', 'Ohio', 'TN', 'KY', 'NY', 'XX', 'NY'],
+                                           ['60601', '60601-1234', '44060', '42223', '42223', '99999', '60601', 'ZIP'])
+        np.testing.assert_array_equal(consistent, [False, True, True, True, True, True, True, True])
+        self.assertFalse(self.index.is_consistent('NY', '60601'))
+
+    def test_tracts_of(self):
+        np.testing.assert_array_equal(self.index.tracts_of(['60601', '12345', '']), [17031081403, 17031081500])
+
+    def test_fingerprint(self):
+        self.assertEqual(self.index.fingerprint(), ZipIndex([60601, 60601, 44060, 42223, 42223],
+                                                            [17031081403, 17031081500, 39085206500, 21047200100,
+                                                             47125101800]).fingerprint())
+        self.assertNotEqual(self.index.fingerprint(), ZipIndex([60601], [17031081403]).fingerprint())
+
+    def test_from_relationship_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'tab20_zcta520_tract20_natl.txt')
+            pd.DataFrame({'OID_ZCTA5_20': ['1', '', '2'], 'GEOID_ZCTA5_20': ['60601', '', '02134'],
+                          'GEOID_TRACT_20': ['17031081403', '02013000100', '25025000301'],
+                          'AREALAND_PART': ['1', '2', '3']}).to_csv(path, sep='|', index=False)
+            index = ZipIndex.from_relationship_file(path)
+        np.testing.assert_array_equal(index.zips, [2134, 60601])
+        self.assertTrue(index.is_consistent('MA', '02134'))
+        self.assertFalse(index.is_consistent('IL', '02134'))
+
+    def test_prefilter_csv(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'addresses.csv')
+            kept_filename = os.path.join(tmp_dir, 'addresses.csv.prefiltered.csv')
+            pd.DataFrame([[1, '9999999 MSON', 'CHICAGO', 'NY', '60601'],
+                          [2, '70 W MADISON ST', 'CHICAGO', 'IL', '60601'],
+                          [3, '7701 MENTOR AVE', 'MENTOR', 'OH', '44060']]).to_csv(filename, header=False, index=False)
+
+            rejected = prefilter_csv(filename, kept_filename, self.index, chunksize=2)
+            kept = pd.read_csv(kept_filename, header=None)
+            zips = zip_codes_of(filename)
+
+        self.assertEqual(list(rejected['ID']), ['1'])
+        self.assertEqual(list(rejected['Street address']), ['9999999 MSON, CHICAGO, NY, 60601'])
+        self.assertEqual(list(kept[0]), [2, 3])
+        self.assertEqual(zips, {'60601', '44060'})
+
+
+if __name__ == '__main__':
+    unittest.main()
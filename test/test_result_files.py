@@ -0,0 +1,90 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.result_files import ResultWriter, iter_results, merge_results, read_results, typed
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+COLUMNS = ['ID', 'Street address', 'corrected_address', 'state', 'county', 'tract', 'block', 'blockgroup',
+           'autocorrected_addr', 'same_addr']
+
+
+class TestResultFiles(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame({'ID': [1, 2, 3],
+                                'Street address': ['7701 MENTOR AVE, MENTOR, OH, 44060', '9999999 MSON, CHICAGO, NY',
+                                                   '70 W MADISON ST, CHICAGO, IL, 60602'],
+                                'corrected_address': ['7701 MENTOR AVE, MENTOR, OH, 44060', None, None],
+                                'state': [39, None, None], 'county': [85, None, None],
+                                'tract': pd.array([206500, None, 3201], dtype='Int64'),
+                                'block': [2055, None, 1008.0], 'blockgroup': ['2', None, '1'],
+                                'autocorrected_addr': [None, None, '70 W Madison St, Chicago, IL 60602, USA'],
+                                'same_addr': [None, None, True]})
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_typed(self):
+        df = typed(self.df)
+        self.assertEqual(df.loc[0, 'state'], '39')
+        self.assertEqual(df.loc[0, 'county'], '085')
+        self.assertEqual(str(df['tract'].dtype), 'Int32')
+        self.assertEqual(df.loc[2, 'blockgroup'], 1)
+        self.assertTrue(df.loc[2, 'same_addr'])
+        self.assertTrue(pd.isna(df.loc[1, 'block']))
+
+    def test_csv(self):
+        path = os.path.join(self.directory.name, 'finished.csv')
+        with ResultWriter(path, COLUMNS) as writer:
+            writer.write(self.df)
+            writer.write(self.df.iloc[:1])
+        df = read_results(path)
+        self.assertEqual(list(df.columns), COLUMNS)
+        self.assertEqual(list(df['ID']), [1, 2, 3, 1])
+
+        # Read back with nulls, the codes are floats, they are written as integers again, like in Parquet
+        merged_path = os.path.join(self.directory.name, 'merged.csv')
+        merge_results([path], merged_path)
+        merged = pd.read_csv(merged_path, dtype=str, keep_default_na=False)
+        codes = ['state', 'county', 'tract', 'block', 'blockgroup']
+        self.assertEqual(list(merged.loc[0, codes]), ['39', '085', '206500', '2055', '2'])
+        self.assertEqual(list(merged.loc[2, codes]), ['', '', '3201', '1008', '1'])
+
+    @unittest.skipUnless(HAS_PYARROW, 'Parquet needs pyarrow')
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+        path = os.path.join(self.directory.name, 'finished.parquet')
+        with ResultWriter(path, COLUMNS) as writer:
+            writer.write(self.df)
+            writer.write(self.df.iloc[:0])
+            writer.write(self.df.iloc[:1])
+        self.assertEqual(pq.ParquetFile(path).metadata.num_row_groups, 2)
+        df = read_results(path)
+        self.assertEqual(list(df['ID']), ['1', '2', '3', '1'])
+        self.assertEqual(str(df['tract'].dtype), 'Int32')
+        self.assertEqual(str(df['block'].dtype), 'Int16')
+        self.assertEqual(str(df['blockgroup'].dtype), 'Int8')
+        self.assertEqual(str(df['same_addr'].dtype), 'boolean')
+        self.assertEqual(str(df['county'].dtype), 'category')
+        self.assertEqual(df.loc[0, 'county'], '085')
+        self.assertEqual([len(chunk) for chunk in iter_results(path, chunksize=2)], [2, 1, 1])
+
+    @unittest.skipUnless(HAS_PYARROW, 'Parquet needs pyarrow')
+    def test_merge(self):
+        paths = []
+        for i, extension in enumerate(['csv', 'parquet', 'csv']):
+            paths.append(os.path.join(self.directory.name, f'{i}.{extension}'))
+            with ResultWriter(paths[-1], COLUMNS) as writer:
+                writer.write(self.df.iloc[:i])
+        merged_path = os.path.join(self.directory.name, 'merged.parquet')
+        merge_results(paths, merged_path)
+        self.assertEqual(list(read_results(merged_path)['ID']), ['1', '1', '2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
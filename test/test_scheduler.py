@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase
+
+from src.scheduler import Scheduler, TokenBucket
+
+
+class TestScheduler(IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.scheduler = Scheduler(max_in_flight=2, rates={'upstream': 1000}, max_retries=3,
+                                   backoff_base=0.001, backoff_max=0.01)
+        self.in_flight = self.max_in_flight = 0
+
+    async def _request(self, status):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return SimpleNamespace(status=status)
+
+    async def test_max_in_flight(self):
+        await asyncio.gather(*(self.scheduler.run('upstream', self._request, 200) for _ in range(10)))
+        self.assertEqual(self.max_in_flight, 2)
+
+    async def test_retry_on_status(self):
+        statuses = iter([429, 503, 200])
+        response = await self.scheduler.run('upstream', lambda: SimpleNamespace(status=next(statuses)))
+        self.assertEqual(response.status, 200)
+        self.assertEqual(self.scheduler.retries, 2)
+        self.assertLess(self.scheduler.buckets['upstream'].rate, 1000)
+
+    async def test_retry_on_exception(self):
+        def fail():
+            raise ConnectionError()
+
+        with self.assertRaises(ConnectionError):
+            await self.scheduler.run('upstream', fail)
+        self.assertEqual(self.scheduler.retries, 3)
+
+    async def test_token_bucket_throttle_and_recover(self):
+        bucket = TokenBucket(100, min_rate=1)
+        bucket.throttle()
+        self.assertEqual(bucket.rate, 50)
+        for _ in range(100):
+            bucket.recover()
+        self.assertEqual(bucket.rate, 100)
+
+    async def test_throttled_exception(self):
+        class Throttled(Exception):
+            pass
+
+        errors = iter([Throttled(), ValueError()])
+
+        def fail():
+            raise next(errors)
+
+        # A throttling exception is retried and slows the upstream down, another exception is raised at once
+        with self.assertRaises(ValueError):
+            await self.scheduler.run('upstream', fail, throttled=lambda exc: isinstance(exc, Throttled))
+        self.assertEqual(self.scheduler.retries, 1)
+        self.assertEqual(self.scheduler.buckets['upstream'].rate, 500)
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+
+import pandas as pd
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.data_handler import DataHandler
+from src.prefilter import ZipIndex
+from src.service import GeocodingService, create_app
+
+
+class TestGeocodingService(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.batches = []
+        self.google_addresses = []
+
+        async def fake_upload(chunk, session):
+            self.batches.append(list(chunk.iloc[:, 1]))
+            return pd.DataFrame([[row[0], ', '.join(map(str, row[1:])), 'Match' if 'MENTOR' in row[1] else 'No_Match',
+                                  'Exact', ', '.join(map(str, row[1:])), None, None, None, 39, 85, 206500, 2055]
+                                 for row in chunk.values], columns=DataHandler.CENSUS_COLUMNS)
+
+        async def fake_process(address, session):
+            self.google_addresses.append(address)
+            return 3201, 1, 1008, '70 W Madison St, Chicago, IL 60602, USA', True
+
+        self.service = GeocodingService(window=0.05, google_key='google', census_key='census')
+        self.service.data_handler._upload_to_census = fake_upload
+        self.service.geocoder.process = fake_process
+
+    async def test_concurrent_addresses_share_a_batch(self):
+        async with self.service:
+            results = await asyncio.gather(self.service.geocode('7701 MENTOR AVE', 'MENTOR', 'OH', '44060'),
+                                           self.service.geocode('7701 Mentor Ave.', 'Mentor', 'OH', '44060'),
+                                           self.service.geocode('70 W MADISON ST', 'CHICAGO', 'IL', '60602'))
+
+        # The two spellings of the same address were looked up once
+        self.assertEqual(self.batches, [['7701 MENTOR AVE', '70 W MADISON ST']])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0]['source'], 'census')
+        self.assertEqual((results[0]['state'], results[0]['county'], results[0]['tract']), (39, 85, 206500))
+        self.assertEqual((results[0]['blockgroup'], results[0]['block']), (2, 2055))
+        # Census did not match the last one, Google did
+        self.assertEqual(self.google_addresses, ['70 W MADISON ST, CHICAGO, IL, 60602'])
+        self.assertEqual(results[2]['source'], 'google')
+        self.assertEqual((results[2]['tract'], results[2]['blockgroup'], results[2]['block']), (3201, 1, 1008))
+        self.assertTrue(results[2]['same_addr'])
+
+    async def test_full_batch_is_sent_without_waiting(self):
+        self.service.window = 10
+        self.service.max_batch_size = 2
+        async with self.service:
+            await asyncio.wait_for(asyncio.gather(self.service.geocode('7701 MENTOR AVE', 'MENTOR', 'OH', '44060'),
+                                                  self.service.geocode('1 MENTOR AVE', 'MENTOR', 'OH', '44060')), 1)
+        self.assertEqual(len(self.batches), 1)
+
+    async def test_census_failure_falls_back_to_google(self):
+        async def failed_upload(chunk, session):
+            raise ConnectionError('Census is down')
+
+        self.service.data_handler._upload_to_census = failed_upload
+        async with self.service:
+            result = await self.service.geocode('7701 MENTOR AVE', 'MENTOR', 'OH', '44060')
+        self.assertEqual(result['source'], 'google')
+
+    async def test_rejected_address_is_not_looked_up(self):
+        self.service.zip_index = ZipIndex([60601], [17031081403])
+        async with self.service:
+            result = await self.service.geocode('9999999 MSON', 'CHICAGO', 'NY', '60601')
+        self.assertIsNone(result['source'])
+        self.assertEqual(result['address'], '9999999 MSON, CHICAGO, NY, 60601')
+        self.assertEqual((self.batches, self.google_addresses), ([], []))
+
+    async def test_app(self):
+        async with TestClient(TestServer(create_app(self.service))) as client:
+            response = await client.get('/geocode', params={'street': '7701 MENTOR AVE', 'city': 'MENTOR',
+                                                            'state': 'OH', 'zip': '44060'})
+            self.assertEqual(response.status, 200)
+            self.assertEqual((await response.json())['tract'], 206500)
+
+            response = await client.post('/geocode', json=[
+                {'street': '7701 MENTOR AVE', 'city': 'MENTOR', 'state': 'OH', 'zip': '44060'},
+                {'street': '70 W MADISON ST', 'city': 'CHICAGO', 'state': 'IL', 'zip': '60602'}])
+            self.assertEqual([result['source'] for result in await response.json()], ['census', 'google'])
+
+            response = await client.post('/geocode', json={'street': '7701 MENTOR AVE'})
+            self.assertEqual(response.status, 400)
+
+            response = await client.post('/geocode', data='{"street": ', headers={'Content-Type': 'application/json'})
+            self.assertEqual(response.status, 400)
+
+            response = await client.get('/metrics')
+            self.assertIn('zipcodes_', await response.text())
+
+
+if __name__ == '__main__':
+    unittest.main()
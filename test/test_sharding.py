@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.sharding import shard_keys, split_csv
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'addresses.csv')
+        rows = [[i, f'{i % 40} Main St.', 'Chicago', 'IL', '60602'] for i in range(200)]
+        rows.append([200, '1  MAIN ST', 'CHICAGO', 'IL', '60602'])
+        rows.append([201, '1 Main Street', 'Chicago', 'Illinois', '60602-1234'])
+        pd.DataFrame(rows).to_csv(self.filename, header=False, index=False)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_split(self):
+        paths = split_csv(self.filename, 3, chunksize=50)
+        shards = [pd.read_csv(path, header=None, dtype=str) for path in paths]
+        self.assertCountEqual(pd.concat(shards)[0].astype(int), range(202))
+        for shard in shards:
+            # Every row of an address is in the same shard, in the order of the file
+            self.assertTrue(shard[0].astype(int).is_monotonic_increasing)
+        shard_of_id = {int(row_id): i for i, shard in enumerate(shards) for row_id in shard[0]}
+        self.assertEqual(shard_of_id[1], shard_of_id[41])
+        self.assertEqual(shard_of_id[1], shard_of_id[200])
+        self.assertEqual(shard_of_id[1], shard_of_id[201])
+
+    def test_shard_keys(self):
+        keys = shard_keys(pd.Series(['5412 Youngstown Warren Road, Niles, Ohio 44446-1234, USA',
+                                     '5412 YOUNGSTOWN WARREN RD , NILES , OH , 44446',
+                                     '1 N Main St, Charleston, West Virginia 25301']))
+        self.assertEqual(list(keys), ['5412 YOUNGSTOWN WARREN RD NILES OH 44446',
+                                      '5412 YOUNGSTOWN WARREN RD NILES OH 44446', '1 N MAIN ST CHARLESTON WV 25301'])
+
+    def test_split_is_reused(self):
+        paths = split_csv(self.filename, 2)
+        mtimes = [os.path.getmtime(path) for path in paths]
+        self.assertEqual(split_csv(self.filename, 2), paths)
+        self.assertEqual([os.path.getmtime(path) for path in paths], mtimes)
+
+
+    def test_split_empty_file(self):
+        open(self.filename, 'w').close()
+        paths = split_csv(self.filename, 2)
+        self.assertEqual([os.path.getsize(path) for path in paths], [0, 0])
+
+if __name__ == '__main__':
+    unittest.main()
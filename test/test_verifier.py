@@ -0,0 +1,41 @@
+import copy
+import unittest
+
+import numpy as np
+
+from src.verifier import reverify_results, score_addresses, verify_address, verify_addresses
+
+
+class TestVerifier(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.address_components = [{'long_name': '5412', 'short_name': '5412', 'types': ['street_number']},
+                                   {'long_name': 'Youngstown Warren Road', 'short_name': 'Youngstown Warren Rd',
+                                    'types': ['route']},
+                                   {'long_name': 'Niles', 'short_name': 'Niles', 'types': ['locality', 'political']},
+                                   {'long_name': 'Ohio', 'short_name': 'OH',
+                                    'types': ['administrative_area_level_1', 'political']},
+                                   {'long_name': '44446', 'short_name': '44446', 'types': ['postal_code']}]
+        self.street = '5412 YOUNGSTOWN WARREN RD , NILES , OH , 44446'
+
+    def test_verify_addresses(self):
+        wrong_zip = copy.deepcopy(self.address_components)
+        wrong_zip[-1]['long_name'] = '4'
+        received = verify_addresses([self.street, self.street, self.street, '368 N 750 W, American Fork, UT 84003'],
+                                    [self.address_components, wrong_zip, None, self.address_components])
+        np.testing.assert_array_equal(received, [True, False, False, False])
+        # The scalar path gives the same answers
+        self.assertEqual([verify_address(self.street, self.address_components),
+                          verify_address(self.street, wrong_zip), verify_address(self.street, None),
+                          verify_address('368 N 750 W, American Fork, UT 84003', self.address_components)],
+                         list(received))
+
+    def test_score_addresses(self):
+        received = score_addresses(['5412 YOUNGSTOWN WARREN ST, NILES, OH, 44446'], [self.address_components])
+        np.testing.assert_array_almost_equal(received, [0.8])
+
+    def test_reverify_results(self):
+        received = reverify_results([self.street, self.street, self.street],
+                                    ['5412 Youngstown Warren Rd, Niles, OH 44446, USA',
+                                     '5412 Youngstown Warren Rd, Warren, OH 44446, USA', None])
+        np.testing.assert_array_equal(received, [True, False, False])